@@ -0,0 +1,134 @@
+"""Benchmark chat aggregate loading: fetched rows and latency by chat size.
+
+Compares the single joined SELECT formerly used by TGChatRepository with the
+current per-collection loading. Synthetic chats are created and removed.
+
+    python -m Scripts.bench_chat_load
+"""
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import delete, event, insert
+from sqlalchemy.future import select
+from sqlalchemy.orm import contains_eager, joinedload
+
+from app.db_service.models import (
+    BudgetItem,
+    Category,
+    ChatBalance,
+    ChatBudgetItem,
+    ChatDebt,
+    ChatFond,
+    ChatValute,
+    TGChat,
+    Valute,
+)
+from app.db_service.repository import TGChatRepository
+from app.db_service.session import async_engine, session_factory
+
+
+# categories, budget items per category, valutes, balances/fonds/debts each
+SIZES = [(2, 3, 2, 2), (3, 5, 3, 3), (5, 6, 4, 5), (6, 5, 5, 10)]
+REPEATS = 3
+TG_ID_BASE = -900_000_000
+
+fetched_rows = []
+
+
+@event.listens_for(async_engine.sync_engine, 'after_cursor_execute')
+def _count_rows(conn, cursor, statement, parameters, context, executemany):
+    fetched_rows.append(max(cursor.rowcount, 0))
+
+
+def legacy_query(tg_id: int):
+    return (
+        select(TGChat)
+        .outerjoin(ChatBudgetItem, ChatBudgetItem.chat_id == TGChat.id)
+        .outerjoin(Category, Category.id == ChatBudgetItem.category_id)
+        .outerjoin(BudgetItem, BudgetItem.id == ChatBudgetItem.budget_item_id)
+        .options(
+            contains_eager(TGChat.categories).contains_eager(Category.budget_items),
+            joinedload(TGChat.valutes),
+            joinedload(TGChat.balances).joinedload(ChatBalance.valute),
+            joinedload(TGChat.fonds).joinedload(ChatFond.valute),
+            joinedload(TGChat.debts).joinedload(ChatDebt.valute),
+        )
+        .where(TGChat.tg_id == tg_id)
+    )
+
+
+async def create_chat(tg_id: int, categories: int, items: int, valutes: int, balances: int) -> int:
+    async with session_factory() as session, session.begin():
+        chat_id = await session.scalar(
+            insert(TGChat).values(tg_id=tg_id, type='group', title='bench').returning(TGChat.id))
+        valute_ids = (await session.scalars(
+            insert(Valute).returning(Valute.id),
+            [dict(name=f'bench{i}', symbol='b', code=f'B{i:02}') for i in range(valutes)])).all()
+        await session.execute(
+            insert(ChatValute), [dict(chat_id=chat_id, valute_id=v) for v in valute_ids])
+        for model in (ChatBalance, ChatFond, ChatDebt):
+            await session.execute(insert(model), [
+                dict(chat_id=chat_id, valute_id=valute_ids[i % valutes], name=f'b{i}', amount=i)
+                for i in range(balances)])
+        for c in range(categories):
+            category_id = await session.scalar(
+                insert(Category).values(name=f'bench_{tg_id}_{c}').returning(Category.id))
+            item_ids = (await session.scalars(insert(BudgetItem).returning(BudgetItem.id), [
+                dict(name=f'bench_{tg_id}_{c}_{i}', type='EXPENSE') for i in range(items)])).all()
+            await session.execute(insert(ChatBudgetItem), [
+                dict(chat_id=chat_id, category_id=category_id, budget_item_id=i) for i in item_ids])
+        return chat_id
+
+
+async def drop_chat(tg_id: int) -> None:
+    async with session_factory() as session, session.begin():
+        await session.execute(delete(TGChat).where(TGChat.tg_id == tg_id))
+        await session.execute(delete(Category).where(Category.name.like(f'bench_{tg_id}_%')))
+        await session.execute(delete(BudgetItem).where(BudgetItem.name.like(f'bench_{tg_id}_%')))
+        await session.execute(delete(Valute).where(Valute.name.like('bench%')))
+
+
+async def load_legacy(tg_id: int) -> TGChat:
+    async with session_factory() as session:
+        return (await session.execute(legacy_query(tg_id))).unique().scalar()
+
+
+async def measure(load, tg_id: int) -> tuple[int, int, float, TGChat]:
+    timings = []
+    for _ in range(REPEATS):
+        fetched_rows.clear()
+        start = time.perf_counter()
+        chat = await load(tg_id)
+        timings.append(time.perf_counter() - start)
+    return len(fetched_rows), sum(fetched_rows), statistics.median(timings) * 1000, chat
+
+
+def shape(chat: TGChat) -> tuple:
+    return (
+        sorted((c.name, sorted(b.name for b in c.budget_items)) for c in chat.categories),
+        sorted(v.code for v in chat.valutes),
+        sorted((b.name, b.valute.code) for b in chat.balances + chat.fonds + chat.debts),
+    )
+
+
+async def main():
+    repo = TGChatRepository()
+    print(f'{"size":>16} | {"legacy rows":>11} {"ms":>7} | {"queries":>7} {"rows":>5} {"ms":>7}')
+    for categories, items, valutes, balances in SIZES:
+        tg_id = TG_ID_BASE - categories
+        await drop_chat(tg_id)
+        await create_chat(tg_id, categories, items, valutes, balances)
+        try:
+            _, legacy_rows, legacy_ms, legacy_chat = await measure(load_legacy, tg_id)
+            queries, rows, ms, chat = await measure(repo._load_by_tg_id, tg_id)
+            assert shape(chat) == shape(legacy_chat), 'aggregates differ'
+            size = f'{categories}x{items}/{valutes}/{balances}'
+            print(f'{size:>16} | {legacy_rows:>11} {legacy_ms:>7.2f} | {queries:>7} {rows:>5} {ms:>7.2f}')
+        finally:
+            await drop_chat(tg_id)
+    await async_engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
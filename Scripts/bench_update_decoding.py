@@ -0,0 +1,107 @@
+"""Benchmark getUpdates response decoding: updates per second before and after.
+
+Compares the former decoding, json of the whole response followed by
+TGUpdateSchema validation of every result, with the current single
+validating pass over raw bytes. Payloads are read from a file with one
+recorded getUpdates response body per line, or built from sample updates
+mixing handled and ignored update kinds.
+
+    python -m Scripts.bench_update_decoding [recorded.jsonl]
+"""
+import json
+import sys
+import time
+
+from app.tg_service.client import TelegramClient
+from app.tg_service.schemas import TGUpdateSchema
+
+
+UPDATES_PER_RESPONSE = 100
+RESPONSES = 50
+REPEATS = 5
+
+USER = {'id': 111, 'is_bot': False, 'first_name': 'Ann', 'username': 'ann', 'language_code': 'en'}
+CHAT = {'id': -1001, 'type': 'group', 'title': 'budget', 'all_members_are_administrators': True}
+BOT_MESSAGE = {
+    'message_id': 10, 'from': {'id': 222, 'is_bot': True, 'first_name': 'bot'}, 'chat': CHAT,
+    'date': 1700000000, 'text': 'Choose item',
+    'reply_markup': {'inline_keyboard': [[{'text': f'item {i}', 'callback_data': f'{{"id": {i}}}'}
+                                          for i in range(3)] for _ in range(4)]},
+}
+SAMPLE_UPDATES = [
+    {'message': {'message_id': 1, 'from': USER, 'chat': CHAT, 'date': 1700000000, 'text': '/add@bot',
+                 'entities': [{'offset': 0, 'length': 8, 'type': 'bot_command'}]}},
+    {'message': {'message_id': 2, 'from': USER, 'chat': CHAT, 'date': 1700000001, 'text': '125.50',
+                 'reply_to_message': {**BOT_MESSAGE, 'reply_markup': None}}},
+    {'callback_query': {'id': '42', 'from': USER, 'message': BOT_MESSAGE, 'chat_instance': '-77',
+                        'data': '{"id": 1}'}},
+    {'message': {'message_id': 3, 'from': USER, 'chat': CHAT, 'date': 1700000002,
+                 'sticker': {'file_id': 'x', 'width': 512, 'height': 512}}},
+    {'edited_message': {'message_id': 2, 'from': USER, 'chat': CHAT, 'date': 1700000001,
+                        'edit_date': 1700000005, 'text': '125.60'}},
+    {'my_chat_member': {'chat': CHAT, 'from': USER, 'date': 1700000003}},
+]
+
+
+def build_payloads() -> list[bytes]:
+    """Build getUpdates response bodies cycling through sample updates."""
+    payloads = []
+    update_id = 1
+    for _ in range(RESPONSES):
+        result = []
+        for i in range(UPDATES_PER_RESPONSE):
+            result.append({'update_id': update_id, **SAMPLE_UPDATES[i % len(SAMPLE_UPDATES)]})
+            update_id += 1
+        payloads.append(json.dumps({'ok': True, 'result': result}).encode())
+    return payloads
+
+
+def decode_legacy(content: bytes) -> list:
+    updates = []
+    for result in json.loads(content).get('result', []):
+        update = TGUpdateSchema.model_validate(result)
+        updates.append(update.message or update.callback_query)
+    return updates
+
+
+def decode_current(content: bytes) -> list:
+    updates = []
+    for update in TelegramClient._parse_updates(content).result:
+        updates.append(update.handled_update)
+    return updates
+
+
+def measure(decode, payloads: list[bytes]) -> tuple[float, int]:
+    """Get best updates per second of decoding all payloads and count of queued updates."""
+    best = 0.0
+    queued = 0
+    for _ in range(REPEATS):
+        decoded = 0
+        queued = 0
+        started = time.perf_counter()
+        for content in payloads:
+            updates = decode(content)
+            decoded += len(updates)
+            queued += sum(1 for update in updates if update)
+        best = max(best, decoded / (time.perf_counter() - started))
+    return best, queued
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'rb') as file:
+            payloads = [line for line in file if line.strip()]
+    else:
+        payloads = build_payloads()
+    updates_count = sum(len(json.loads(content).get('result', [])) for content in payloads)
+    print(f'{len(payloads)} responses, {updates_count} updates')
+    legacy_rate, legacy_queued = measure(decode_legacy, payloads)
+    current_rate, current_queued = measure(decode_current, payloads)
+    print(f'{"decoding":>10} | {"updates/s":>10} {"queued":>7}')
+    print(f'{"legacy":>10} | {legacy_rate:>10.0f} {legacy_queued:>7}')
+    print(f'{"current":>10} | {current_rate:>10.0f} {current_queued:>7}')
+    print(f'speedup x{current_rate / legacy_rate:.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""Check repository hot path queries are served by indexes.
+
+Seeds a large synthetic dataset inside one transaction, runs repository
+queries capturing their SQL, EXPLAINs every statement and fails if any of
+the large tables is read by a sequential scan. The transaction is rolled
+back, nothing is left in the database.
+
+    python -m Scripts.check_query_plans
+"""
+import asyncio
+import datetime
+import json
+import sys
+
+from sqlalchemy import event, text
+
+from app.db_service.repository import DatabaseAccessor
+from app.db_service.session import async_engine, unit_of_work
+
+
+CHATS = 2000
+ITEMS_PER_CHAT = 20
+ENTRIES_PER_ITEM = 10
+SYNTHETIC_VALUTES = 30
+DAYS = 3 * 365
+TG_ID_BASE = -800_000_000
+
+LARGE_TABLES = {
+    'tg_chats', 'tg_users', 'tg_user_states', 'chat_budget_items', 'chat_valutes', 'entries',
+    'valute_rates', 'valute_exchanges', 'chat_balances', 'chat_fonds', 'chat_debts',
+    'entry_month_totals',
+}
+# whole chat history is joined with rates, hashing the rates table is cheaper than probing it
+ALLOWED_SEQ_SCANS = {
+    'entry_repo.get_chat_entries_totals': {'valute_rates'},
+}
+
+SEED_SQL = """
+INSERT INTO valutes (name, symbol, code)
+SELECT 'plan' || v, 'p', 'P' || v FROM generate_series(1, :valutes) v;
+
+INSERT INTO tg_chats (tg_id, type, title)
+SELECT :tg_id_base - c, 'group', 'plan' FROM generate_series(1, :chats) c;
+
+INSERT INTO tg_users (tg_id, is_bot, first_name)
+SELECT :tg_id_base - u, false, 'plan' FROM generate_series(1, :chats) u;
+
+INSERT INTO tg_user_states (tg_user_id, name, data_raw)
+SELECT id, 'default', '{}' FROM tg_users WHERE first_name = 'plan';
+
+INSERT INTO categories (name) SELECT 'plan' || c FROM generate_series(1, :items) c;
+
+INSERT INTO budget_items (name, type) SELECT 'plan' || i, 'EXPENSE' FROM generate_series(1, :items) i;
+
+INSERT INTO chat_budget_items (chat_id, category_id, budget_item_id)
+SELECT ch.id, ca.id, bi.id
+FROM tg_chats ch
+JOIN categories ca ON ca.name LIKE 'plan%'
+JOIN budget_items bi ON bi.name = ca.name
+WHERE ch.title = 'plan';
+
+INSERT INTO chat_valutes (chat_id, valute_id)
+SELECT ch.id, v.id FROM tg_chats ch JOIN valutes v ON v.code IN ('P1', 'P2') WHERE ch.title = 'plan';
+
+INSERT INTO chat_balances (chat_id, name, amount, valute_id)
+SELECT ch.id, 'plan', 0, v.id FROM tg_chats ch JOIN valutes v ON v.code = 'P1' WHERE ch.title = 'plan';
+INSERT INTO chat_fonds (chat_id, name, amount, valute_id)
+SELECT ch.id, 'plan', 0, v.id FROM tg_chats ch JOIN valutes v ON v.code = 'P1' WHERE ch.title = 'plan';
+INSERT INTO chat_debts (chat_id, name, amount, valute_id)
+SELECT ch.id, 'plan', 0, v.id FROM tg_chats ch JOIN valutes v ON v.code = 'P1' WHERE ch.title = 'plan';
+
+INSERT INTO entries (chat_budget_item_id, chat_id, message_id, valute_id, amount, data_raw, created_at)
+SELECT cbi.id, cbi.chat_id, cbi.id, v.id, n, jsonb_build_object('message_id', cbi.id),
+       now() - interval '1 day' * ((cbi.id * 7 + n * 31) % :days)
+FROM chat_budget_items cbi
+JOIN tg_chats ch ON ch.id = cbi.chat_id AND ch.title = 'plan'
+JOIN valutes v ON v.code = 'P1'
+CROSS JOIN generate_series(1, :entries) n;
+
+INSERT INTO entry_month_totals (chat_id, month, chat_budget_item_id, valute_id, amount, entries_count)
+SELECT e.chat_id, date_trunc('month', e.created_at)::date, e.chat_budget_item_id, e.valute_id,
+       sum(e.amount), count(*)
+FROM entries e JOIN tg_chats ch ON ch.id = e.chat_id AND ch.title = 'plan'
+GROUP BY 1, 2, 3, 4;
+
+INSERT INTO valute_rates (valute_from_id, valute_to_id, rate, date)
+SELECT f.id, t.id, 1, current_date - d
+FROM valutes f JOIN valutes t ON t.code LIKE 'P%' CROSS JOIN generate_series(0, :days) d
+WHERE f.code = 'P1'
+ON CONFLICT DO NOTHING;
+
+INSERT INTO valute_exchanges (chat_id, valute_from_id, valute_to_id, valute_from_amount,
+                              valute_to_amount, created_at)
+SELECT ch.id, f.id, t.id, 1, 1, now() - interval '1 day' * (ch.id % :days)
+FROM tg_chats ch
+JOIN valutes f ON f.code = 'P' || (1 + ch.id % :valutes)
+JOIN valutes t ON t.code = 'P' || (1 + ch.id / :valutes % :valutes)
+CROSS JOIN generate_series(1, 10)
+WHERE ch.title = 'plan';
+
+INSERT INTO valute_rate_watermarks (valute_id)
+SELECT id FROM valutes
+ON CONFLICT DO NOTHING;
+
+ANALYZE;
+"""
+
+captured = []
+
+
+def _capture(conn, cursor, statement, parameters, context, executemany):
+    captured.append((statement, parameters))
+
+
+async def run_queries(db: DatabaseAccessor, tg_id: int) -> dict[str, list[tuple[str, tuple]]]:
+    """Run repository hot path queries, return captured statements by query name."""
+    chat = await db.chat_repo._load_by_tg_id(tg_id)
+    user = await db.user_repo._get_by_tg_id(tg_id)
+    today = datetime.date.today()
+    month_start = today.replace(day=1)
+    year_start = today.replace(month=1, day=1)
+
+    queries = {
+        'chat_repo.get_by_tg_id': lambda: db.chat_repo._load_by_tg_id(tg_id),
+        'user_repo.get_by_tg_id': lambda: db.user_repo._get_by_tg_id(tg_id),
+        'state_repo.get_tg_user_state': lambda: db.state_repo._load_tg_user_state(user.id),
+        'entry_repo.get_years': lambda: db.entry_repo.get_years(chat.id),
+        'entry_repo.get_months': lambda: db.entry_repo.get_months(chat.id, today.year),
+        'entry_repo.get_report': lambda: db.entry_repo.get_report(chat.id, month_start, today),
+        'entry_repo.get_chat_entries_period': lambda: db.entry_repo.get_chat_entries_period(chat.id),
+        'entry_repo.get_chat_entries_valutes': lambda: db.entry_repo.get_chat_entries_valutes(chat.id),
+        'entry_repo.get_chat_entries_totals': lambda: db.entry_repo.get_chat_entries_totals(chat.id),
+        'entry_repo.get_message_entries': lambda: db.entry_repo.get_message_entries(chat.id, 1),
+        'valute_rate_repo.get_period_rates': lambda: db.valute_rate_repo.get_period_rates(
+            ['P1', 'P2', 'P3'], year_start, today),
+        'valute_exchange_repo.get_period_exchanges': lambda: db.valute_exchange_repo.get_period_exchanges(
+            ['P1', 'P2'], year_start, today),
+        'valute_rate_repo.get_unrated_dates': lambda: db.valute_rate_repo.get_unrated_dates([today]),
+    }
+    statements = {}
+    event.listen(async_engine.sync_engine, 'before_cursor_execute', _capture)
+    try:
+        for name, query in queries.items():
+            captured.clear()
+            await query()
+            statements[name] = list(captured)
+    finally:
+        event.remove(async_engine.sync_engine, 'before_cursor_execute', _capture)
+    return statements
+
+
+def find_seq_scans(plan: dict) -> set[str]:
+    """Get relations read by sequential scan anywhere in plan tree."""
+    relations = set()
+    if plan.get('Node Type') == 'Seq Scan':
+        relations.add(plan['Relation Name'])
+    for child in plan.get('Plans', []):
+        relations |= find_seq_scans(child)
+    return relations
+
+
+async def main() -> int:
+    db = DatabaseAccessor()
+    failed = False
+    async with unit_of_work() as unit:
+        connection = await unit.session.connection()
+        params = dict(tg_id_base=TG_ID_BASE, chats=CHATS, items=ITEMS_PER_CHAT,
+                      entries=ENTRIES_PER_ITEM, valutes=SYNTHETIC_VALUTES, days=DAYS)
+        for statement in SEED_SQL.split(';'):
+            if statement.strip():
+                await connection.execute(text(statement), params)
+        statements = await run_queries(db, TG_ID_BASE - CHATS // 2)
+        for name, queries in statements.items():
+            for statement, parameters in queries:
+                result = await connection.exec_driver_sql(
+                    f'EXPLAIN (FORMAT JSON) {statement}', parameters)
+                if isinstance(plan := result.scalar(), str):
+                    plan = json.loads(plan)
+                seq_scans = find_seq_scans(plan[0]['Plan']) & LARGE_TABLES
+                seq_scans -= ALLOWED_SEQ_SCANS.get(name, set())
+                failed = failed or bool(seq_scans)
+                status = f'FAIL seq scan {", ".join(sorted(seq_scans))}' if seq_scans else 'ok'
+                print(f'{name:45} {status}')
+        await unit.session.rollback()
+    await async_engine.dispose()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
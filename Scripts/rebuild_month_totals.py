@@ -0,0 +1,24 @@
+"""Rebuild entry_month_totals rollup from entries.
+
+Entries writes are blocked while the rollup is recalculated.
+
+    python -m Scripts.rebuild_month_totals
+"""
+import asyncio
+
+from app.db_service.repository import DatabaseAccessor
+from app.db_service.session import async_engine
+
+
+async def main():
+    db = DatabaseAccessor()
+    rows_count = await db.entry_repo.rebuild_month_totals()
+    if rows_count is None:
+        print('rebuild failed, see db log')
+    else:
+        print(f'entry_month_totals rebuilt, {rows_count} rows')
+    await async_engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
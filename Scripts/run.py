@@ -1,12 +1,16 @@
 import asyncio
-from app.engine import Engine
 
 
 def run():
+    # imported here, so render pool workers re-importing this module as __mp_main__
+    # do not set up logging, database engine and config
+    from app.engine import Engine
+
     try:
         loop = asyncio.get_event_loop()
         engine = Engine()
-        loop.create_task(engine.start_app())
+        # startup errors, e.g. rejected webhook, stop the process instead of a silent task failure
+        loop.run_until_complete(engine.start_app())
         loop.run_forever()
     except KeyboardInterrupt:
         loop.run_until_complete(engine.stop_app())
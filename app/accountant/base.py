@@ -1,3 +1,4 @@
+from contextlib import nullcontext
 import json
 from typing import Optional, Type, Union
 
@@ -5,6 +6,7 @@ from app import exceptoions
 from app.accountant.enums import CallbackHandlerEnum, MessageHandlerEnum
 from app.db_service.models import TGChat, TGUser, TGUserState
 from app.db_service.repository import DatabaseAccessor
+from app.db_service.session import unit_of_work
 from app.tg_service import TelegramClient
 from app.tg_service.editor import TGMessageEditor
 from app.tg_service.schemas import TGCallbackQuerySchema, TGChatSchema, TGFromSchema, TGMessageSchema
@@ -22,12 +24,14 @@ class Accountant:
     callback_handlers: dict[str, BaseHandler]
     message_handlers: dict[str, BaseHandler]
     common_callback_handlers: dict[str, BaseHandler]
+    use_unit_of_work: bool
 
     def __init__(self, db: DatabaseAccessor, tg_client: TelegramClient, editor: TGMessageEditor,
                  command_handlers: dict[str, Type[BaseHandler]],
                  callback_handlers: dict[str, Type[BaseHandler]],
                  message_handlers: dict[str, Type[BaseHandler]],
-                 common_callback_handlers: dict[str, Type[BaseHandler]]):
+                 common_callback_handlers: dict[str, Type[BaseHandler]],
+                 use_unit_of_work: bool = False):
         """Initialize accountant."""
         self.db = db
         self.tg_client = tg_client
@@ -36,10 +40,15 @@ class Accountant:
         self.callback_handlers = callback_handlers
         self.message_handlers = message_handlers
         self.common_callback_handlers = common_callback_handlers
+        self.use_unit_of_work = use_unit_of_work
 
     @exceptoions.catch_exception
     async def process_message(self, update: Union[TGMessageSchema, TGCallbackQuerySchema]):
-        """Process Telegram update."""
+        """Process Telegram update, in one database transaction if unit of work is used."""
+        async with unit_of_work() if self.use_unit_of_work else nullcontext():
+            await self._process_update(update)
+
+    async def _process_update(self, update: Union[TGMessageSchema, TGCallbackQuerySchema]):
         is_message = isinstance(update, TGMessageSchema)
         chat_schema = update.chat if is_message else update.message.chat
         chat = await self._get_or_create_chat(chat_schema)
@@ -1,18 +1,19 @@
 
 import enum
 from abc import abstractmethod
-from typing import Optional, Union
+from typing import Optional, Type, Union
 
 from app import exceptoions
 from app.accountant import constants
 from app.db_service.models import Category, ChatValute, TGChat, TGUser, TGUserState, Valute
 from app.db_service.repository import DatabaseAccessor
+from app.db_service.session import commit_unit_of_work
 from app.tg_service import api as tg_api
 from app.tg_service import schemas
 from app.tg_service.client import SendTaskSchema, TelegramClient
 from app.tg_service.editor import TGMessageEditor
 from app.tg_service.schemas import (
-    DeleteMessageRequestSchema,
+    DeleteMessagesRequestSchema,
     EditMessageReplyMarkupRequestSchema,
     EditMessageTextRequestSchema,
     ForceReplySchema,
@@ -51,14 +52,27 @@ class BaseHandler:
     async def handle(self) -> None:
         """Handle Telegram update."""
 
+    async def send(self, method: Type[tg_api.TGAPI], request: schemas.RequestSchema) -> SendTaskSchema:
+        """Queue request to Telegram once writes made so far are committed.
+
+        Chat is not told about writes which could still be rolled back and
+        no transaction is held open while the response is awaited.
+        """
+        await commit_unit_of_work()
+        return await self.tg.send(method, request)
+
     async def delete_message(self, message_id: int) -> SendTaskSchema:
         """Delete message."""
-        request = DeleteMessageRequestSchema(chat_id=self.chat.tg_id,
-                                             message_id=message_id)
-        return await self.tg.send(tg_api.DeleteMessage, request)
+        return await self.delete_messages([message_id])
+
+    async def delete_messages(self, message_ids: list[int]) -> SendTaskSchema:
+        """Delete messages, deletions of the chat sent meanwhile are batched together."""
+        request = DeleteMessagesRequestSchema(chat_id=self.chat.tg_id,
+                                              message_ids=message_ids)
+        return await self.send(tg_api.DeleteMessages, request)
 
     async def delete_income_messages(
-            self, delete_reply_to_msg: bool = False) -> list[SendTaskSchema]:
+            self, delete_reply_to_msg: bool = False) -> SendTaskSchema:
         """Delete request messages."""
         if isinstance(self.update, TGCallbackQuerySchema):
             messages = [self.update.message]
@@ -67,16 +81,13 @@ class BaseHandler:
             reply_to_msg = self.update.reply_to_message
             if delete_reply_to_msg and reply_to_msg:
                 messages.append(reply_to_msg)
-        tasks = []
-        for msg in messages:
-            tasks.append(await self.delete_message(msg.message_id))
-        return tasks
+        return await self.delete_messages([msg.message_id for msg in messages])
 
     async def set_state(self, state_name: enum.Enum, state_data: dict) -> None:
-        """Set user state data."""
-        self.state.name = state_name.value
-        self.state.data_raw = state_data
-        self.state = await self.db.state_repo.update_item(self.state)
+        """Set user state data, cached state is replaced by the written one instead of being altered."""
+        altered = TGUserState(id=self.state.id, tg_user_id=self.state.tg_user_id,
+                              name=state_name.value, data_raw=state_data)
+        self.state = await self.db.state_repo.update_item(altered)
 
     async def wait_task_result(
             self, task: SendTaskSchema, next_state: enum.Enum, state_data: Optional[dict] = None,
@@ -84,8 +95,7 @@ class BaseHandler:
         """Wait for task result and update state."""
         state_data = state_data or {}
         response_to_state = response_to_state or set()
-        await task.event.wait()
-        response: Union[None, schemas.SendMessageResponseSchema] = task.response
+        response: Union[None, schemas.SendMessageResponseSchema] = await task
         if response:
             for key in response_to_state:
                 if key == 'message_id':
@@ -111,7 +121,7 @@ class BaseHandler:
                                            reply_parameters=reply_parameters,
                                            reply_markup=reply_markup,
                                            parse_mode=parse_mode)
-        return await self.tg.send(tg_api.SendMessage, request)
+        return await self.send(tg_api.SendMessage, request)
 
     async def edit_message(
         self,
@@ -127,7 +137,7 @@ class BaseHandler:
                                                text=text,
                                                reply_markup=reply_markup,
                                                parse_mode=parse_mode)
-        return await self.tg.send(tg_api.EditMessageText, request)
+        return await self.send(tg_api.EditMessageText, request)
 
     async def send_photo(
         self,
@@ -143,7 +153,7 @@ class BaseHandler:
             'files': {'photo': photo}
         }
         request = SendPhotoRequestSchema.model_validate(request)
-        return await self.tg.send(tg_api.SendPhoto, request)
+        return await self.send(tg_api.SendPhoto, request)
 
     def get_selected_category(self) -> Category:
         """Get selected category."""
@@ -176,9 +186,9 @@ class BaseHandler:
                            symbol=constants.DEFAULT_VALUTE_SYMBOL,
                            code=constants.DEFAULT_VALUTE_CODE))
             chat_valute = ChatValute(chat_id=chat.id, valute_id=rub_valute.id)
-            chat.valutes = [rub_valute]
             await self.db.chat_valute_repo.create_item(chat_valute)
-        return chat.valutes
+            valutes = [rub_valute]
+        return valutes
 
     def get_selected_valute(self, chat: TGChat, callback: TGCallbackQuerySchema) -> Valute:
         """Get selected valute."""
@@ -207,7 +217,7 @@ class BaseHandler:
         request = EditMessageReplyMarkupRequestSchema(chat_id=self.chat.tg_id,
                                                       message_id=message_id,
                                                       reply_markup=reply_markup)
-        return await self.tg.send(tg_api.EditMessageReplyMarkup, request)
+        return await self.send(tg_api.EditMessageReplyMarkup, request)
 
     @property
     def user_mention(self) -> str:
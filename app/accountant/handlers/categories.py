@@ -1,4 +1,4 @@
-from app.db_service.models import Category
+from app.db_service.models import Category, ChatBudgetItem
 from app.tg_service import schemas as tg_schemas
 
 from .. import constants
@@ -66,9 +66,9 @@ class CategoryAddNameHandler(MessageHandler):
             text = CATEGORY_EXISTS_ERROR.format(new_name)
         else:
             if not (category := await self.db.category_repo.get_by_name(new_name)):
-                category = Category(name=new_name)
-            chat.categories.append(category)
-            await self.db.chat_repo.update_item(chat)
+                category = await self.db.category_repo.create_item(Category(name=new_name))
+            await self.db.chat_budget_item_repo.create_item(
+                ChatBudgetItem(chat_id=chat.id, category_id=category.id))
             text = CATEGORY_CREATED.format(new_name)
         keyboard = self.editor.get_hide_keyboard()
         await self.send_message(text, keyboard)
@@ -16,5 +16,4 @@ class HideCallbackHandler(CallbackHandler):
         to_delete = [callback.message.message_id]
         if isinstance(data, dict) and (delete_also := data.get('delete_also')):
             to_delete.extend(delete_also)
-        for msg_id in to_delete:
-            await self.delete_message(msg_id)
+        await self.delete_messages(to_delete)
@@ -71,9 +71,11 @@ class _EntryAddMixin:
 
     @staticmethod
     async def make_message_entries_line(
-            editor: TGMessageEditor, db: DatabaseAccessor, message_id: int) -> Optional[str]:
+            editor: TGMessageEditor, db: DatabaseAccessor, chat: TGChat,
+            message_id: int) -> Optional[str]:
         """Get message entries line."""
-        if not (data := await db.entry_repo.get_message_entries(message_id=message_id)):
+        if not (data := await db.entry_repo.get_message_entries(
+                chat_id=chat.id, message_id=message_id)):
             return None
 
         lines = []
@@ -125,7 +127,7 @@ class EntryAddCategoryHandler(CallbackHandler, _EntryAddMixin):
 
             current_entry = self.editor.make_entry_line(category.name)
             text = '\n'.join([current_entry, ENTRY_ADD_BUDGET_ITEM])
-            if entered := await self.make_message_entries_line(self.editor, self.db, message_id):
+            if entered := await self.make_message_entries_line(self.editor, self.db, self.chat, message_id):
                 text = '\n\n'.join([entered, text])
 
             task = await self.edit_message(message_id, text, keyboard)
@@ -149,7 +151,7 @@ class EntryAddBudgetItemHandler(CallbackHandler, _EntryAddMixin):
         current_entry = self.editor.make_entry_line(
             category.name, budget_item.name, budget_item.type)
         text = '\n'.join([current_entry, ENTRY_ADD_VALUTE])
-        if entered := await self.make_message_entries_line(self.editor, self.db, message_id):
+        if entered := await self.make_message_entries_line(self.editor, self.db, self.chat, message_id):
             text = '\n\n'.join([entered, text])
         task = await self.edit_message(message_id, text, keyboard)
         await self.wait_task_result(task, CallbackHandlerEnum.ENTRY_ADD_VALUTE,
@@ -171,7 +173,7 @@ class EntryAddValuteHandler(CallbackHandler, _EntryAddMixin):
         valute = self.get_selected_valute(chat=self.chat, callback=callback)
         text = self.editor.make_entry_line(
             category.name, budget_item.name, budget_item.type, valute_code=valute.code)
-        if entered := await self.make_message_entries_line(self.editor, self.db, message_id):
+        if entered := await self.make_message_entries_line(self.editor, self.db, self.chat, message_id):
             text = '\n\n'.join([entered, text])
         await self.edit_message(message_id, text)
 
@@ -222,6 +224,8 @@ class EntryAddAmountHandler(MessageHandler, _EntryAddMixin):
             entry = Entry(chat_budget_item_id=chat_budget_item.id,
                           valute_id=valute.id,
                           amount=amount,
+                          chat_id=chat.id,
+                          message_id=entry_message_id,
                           data_raw={'message_id': entry_message_id})
             await self.db.entry_repo.create_item(entry)
 
@@ -230,7 +234,7 @@ class EntryAddAmountHandler(MessageHandler, _EntryAddMixin):
             keyboard = self.editor.get_finish_keyboard(chat.categories)
             text = ENTRY_ADD_ADDED
             if entered := await self.make_message_entries_line(
-                    self.editor, self.db, entry_message_id):
+                    self.editor, self.db, chat, entry_message_id):
                 text = '\n\n'.join([entered, text])
             await self.edit_message(entry_message_id, text, keyboard)
 
@@ -269,14 +273,14 @@ class EntryAddFinishHandler(CallbackHandler, _EntryAddMixin):
             if user.username:
                 details = f'{user.username} {details}'
             text = '\n'.join([text, details])
-            if entered := await self.make_message_entries_line(self.editor, self.db, message_id):
+            if entered := await self.make_message_entries_line(self.editor, self.db, self.chat, message_id):
                 text = '\n\n'.join([entered, text])
             await self.set_state(MessageHandlerEnum.DEFAULT, {})
             await self.edit_message(message_id, text)
         elif decision == DecisionEnum.MORE:
             await self.set_state(CallbackHandlerEnum.ENTRY_ADD_CATEGORY, {**state.data_raw})
             text = ENTRY_ADD_CATEGORY
-            if entered := await self.make_message_entries_line(self.editor, self.db, message_id):
+            if entered := await self.make_message_entries_line(self.editor, self.db, self.chat, message_id):
                 text = '\n\n'.join([entered, text])
             keyboard = self.editor.get_category_keyboard(chat.categories)
             await self.edit_message(message_id, text, keyboard)
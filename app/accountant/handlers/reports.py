@@ -122,8 +122,7 @@ class ReportSelectMonthHandler(CallbackHandler, ReportHandlerMixin):
             await self.delete_income_messages()
             delete_also = []
             task = await self.send_photo(photo=image)
-            await task.event.wait()
-            response: Optional[SendPhotoResponseSchema] = task.response
+            response: Optional[SendPhotoResponseSchema] = await task
             if response and response.result:
                 delete_also.append(response.result.message_id)
 
@@ -0,0 +1,73 @@
+from collections import defaultdict
+import datetime
+from statistics import geometric_mean
+from typing import Optional
+
+from app.db_service import DatabaseAccessor
+
+
+class RateMatrix:
+    """Period exchanges and daily rates between report valutes, loaded at once.
+
+    Rates are calculated in memory the same way as querying every valutes pair:
+    geometric mean of both directions rates, valute substitutes are treated as one valute.
+    """
+
+    def __init__(
+            self,
+            exchanges: list[tuple[str, str, datetime.datetime, int, float, float]],
+            daily_rates: list[tuple[str, str, datetime.date, float]],
+            substitutes: dict[str, list[str]],
+            precision: int) -> None:
+        """Init rate matrix."""
+        self.substitutes = substitutes
+        self.precision = precision
+        self._exchanges = defaultdict(list)  # {(from_code, to_code): [(created_at, id, from_amount, to_amount)]}
+        for from_code, to_code, *exchange in exchanges:
+            self._exchanges[(from_code, to_code)].append(tuple(exchange))
+        self._daily_rates = defaultdict(list)  # {(from_code, to_code): [(date, rate)]}
+        for from_code, to_code, *daily_rate in daily_rates:
+            self._daily_rates[(from_code, to_code)].append(tuple(daily_rate))
+
+    @classmethod
+    async def load(
+            cls, db: DatabaseAccessor, codes: set[str], period0: datetime.date, period1: datetime.date,
+            substitutes: dict[str, list[str]], precision: int) -> 'RateMatrix':
+        """Load period exchanges and daily rates between valutes and their substitutes."""
+        codes = set(codes)
+        for code in list(codes):
+            codes.update(substitutes.get(code, []))
+        codes = sorted(codes)
+        exchanges = await db.valute_exchange_repo.get_period_exchanges(codes, period0, period1)
+        daily_rates = await db.valute_rate_repo.get_period_rates(codes, period0, period1)
+        return cls(exchanges or [], daily_rates or [], substitutes, precision)
+
+    def _get_rows(self, rows: dict[tuple[str, str], list[tuple]], from_code: str, to_code: str,
+                  last_one: bool) -> list[tuple]:
+        from_codes = [from_code] + self.substitutes.get(from_code, [])
+        to_codes = [to_code] + self.substitutes.get(to_code, [])
+        found = [row for f in from_codes for t in to_codes for row in rows.get((f, t), [])]
+        if last_one and found:
+            found = [max(found)]
+        return found
+
+    def get_exchange_rate(self, from_code: str, to_code: str, last_one: bool = False) -> Optional[float]:
+        """Exchanges rate, last one or mean for period."""
+        rates = [
+            round(to_amount / from_amount, self.precision)
+            for *_, from_amount, to_amount in self._get_rows(self._exchanges, from_code, to_code, last_one)
+        ]
+        rates += [
+            round(from_amount / to_amount, self.precision)
+            for *_, from_amount, to_amount in self._get_rows(self._exchanges, to_code, from_code, last_one)
+        ]
+        return geometric_mean(rates) if rates else None
+
+    def get_daily_rate(self, from_code: str, to_code: str, last_one: bool = False) -> Optional[float]:
+        """Daily rate, last one or mean for period."""
+        rates = [rate for *_, rate in self._get_rows(self._daily_rates, from_code, to_code, last_one)]
+        rates += [
+            round(1 / rate, self.precision)
+            for *_, rate in self._get_rows(self._daily_rates, to_code, from_code, last_one)
+        ]
+        return geometric_mean(rates) if rates else None
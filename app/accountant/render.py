@@ -0,0 +1,148 @@
+# Runs in render pool worker processes: plain data in, PNG bytes out.
+# Do not import config or database dependent app modules here.
+from io import BytesIO
+
+import matplotlib
+
+
+matplotlib.use('Agg')
+
+import matplotlib.gridspec as gridspec  # noqa: E402
+import matplotlib.pyplot as plt  # noqa: E402
+import seaborn as sns  # noqa: E402
+
+
+def warm_up() -> None:
+    """Render a tiny figure, so the first report does not pay for lazy initialization."""
+    fig, ax = plt.subplots(figsize=(1, 1))
+    ax.pie([1], colors=sns.color_palette('deep', n_colors=1))
+    ax.text(0, 0, 'warm up', family='monospace')
+    _to_png(fig)
+
+
+def render_report(data: dict) -> bytes:
+    """Render month report: pie chart and legend per income and expense section."""
+    sections = data['sections']
+    fig = plt.figure(figsize=(data['width'], sum(s['height'] for s in sections)))
+    grid = fig.add_gridspec(len(sections), 1, height_ratios=[s['height'] for s in sections])
+    for index, section in enumerate(sections):
+        _create_section_plot(fig, grid[index], section, data)
+    plt.tight_layout(pad=2.0)
+    return _to_png(fig)
+
+
+def _create_section_plot(
+        fig: plt.Figure, subplot_pos: gridspec.SubplotSpec, section: dict, data: dict,
+        palette='deep') -> None:
+    """Create a section of the report with title, pie chart and legend."""
+    if not (categories := section['categories']):
+        return
+
+    gs = gridspec.GridSpecFromSubplotSpec(
+        2, 1, subplot_pos, height_ratios=[data['pie_chart_height'], section['legend_height']])
+    pie_ax = fig.add_subplot(gs[0])
+    colors = sns.color_palette(palette, n_colors=len(categories))
+    pie_ax.pie(
+        [c['total'] for c in categories],
+        labels=[f'{c["name"]} [{c["total_str"]}]' for c in categories],
+        colors=colors, autopct='%1.1f%%', startangle=90)
+    pie_ax.set_title(section['title'], fontsize=14, pad=20)
+    legend_ax = fig.add_subplot(gs[1])
+    legend_ax.axis('off')
+    legend_items = []
+    for category, color in zip(categories, colors):
+        for name, amount, amount_str in category['items']:
+            formatted_text = (
+                f'{category["name"].upper():{data["max_category_name_length"]}} '
+                f'| {name:{data["max_item_name_length"]}} | {amount_str}'
+            )
+            legend_items.append((color, formatted_text, amount))
+    legend_items.sort(key=lambda x: x[2], reverse=True)
+
+    item_count = len(legend_items)
+    available_height = 0.9
+    line_spacing = available_height / item_count if item_count > 0 else 0.05
+    y_pos = 0.95
+    for color, label, _ in legend_items:
+        legend_ax.text(
+            0.1, y_pos,
+            label,
+            fontsize=9,
+            color=color,
+            transform=legend_ax.transAxes,
+            family='monospace',
+        )
+        y_pos -= line_spacing
+
+
+def render_total_report(data: dict) -> bytes:
+    """Render total report table: title, headers and (label, amount, amount, color) lines."""
+    report_lines = data['lines']
+    image_height = data['image_height']
+    line_height = data['line_height']
+    family = data['family']
+
+    title_line = report_lines[0]
+    headers_line = report_lines[1]
+    no_title_lines = report_lines[1:]
+    no_title_no_header_lines = report_lines[2:]
+    label_width = max(len(label) for label, *_ in no_title_lines)
+    column_1_width = max(len(str(amount)) for _, amount, *_ in no_title_lines if amount)
+    column_2_width = max(len(str(amount)) for _, _, amount, *_ in no_title_lines if amount)
+    title_line_str = title_line[0]
+    title_color = title_line[-1]
+    title_font_size = 14
+    row_font_size = 13
+
+    fig, ax = plt.subplots(figsize=(data['width'], image_height))
+    ax.axis('off')
+
+    y = image_height - line_height
+    ax.text(
+        0, y, title_line_str, fontsize=title_font_size, va='center', ha='left',
+        family=family, color=title_color)
+    y -= line_height * 2
+
+    headers_label, headers_col1, headers_col2, headers_color = headers_line
+    headers_text = (
+        f'{headers_label:<{label_width}} | '
+        f'{headers_col1:<{column_1_width}} | '
+        f'{headers_col2:<{column_2_width}}'
+    )
+    ax.text(
+        0, y, headers_text, fontsize=row_font_size, va='center', ha='left',
+        family=family, color=headers_color, weight='bold')
+    y -= line_height
+
+    for i, (label, cur_amount, valute_amount, color) in enumerate(no_title_no_header_lines):
+        text = f'{label:<{label_width}}'
+        is_subtitle = cur_amount is None and valute_amount is None
+        if is_subtitle:
+            if i > 0:
+                y -= line_height
+            text = text.upper()
+            ax.text(
+                0, y, text, fontsize=row_font_size, va='center', ha='left',
+                family=family, color=color)
+        else:
+            text = [text]
+            for value, width in zip([cur_amount, valute_amount],
+                                    [column_1_width, column_2_width]):
+                value_s = f'{value:>{width}.2f}' if value is not None else f'{"":<{width}}'
+                text.append(value_s)
+            text = ' | '.join(text)
+            ax.text(
+                0, y, text, fontsize=row_font_size, va='center', ha='left',
+                family=family, color=color)
+        y -= line_height
+
+    return _to_png(fig)
+
+
+def _to_png(fig: plt.Figure) -> bytes:
+    buf = BytesIO()
+    fig.savefig(buf, format='png', bbox_inches='tight', pad_inches=0.2, dpi=100)
+    plt.close(fig)
+    image_bytes = buf.getvalue()
+    buf.close()
+    return image_bytes
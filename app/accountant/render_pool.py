@@ -0,0 +1,98 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from logging import getLogger
+import multiprocessing
+import os
+from typing import Callable, Optional
+
+from app.core.config import REPORT_RENDER_MAX_QUEUE, REPORT_RENDER_WORKERS
+
+from .render import warm_up
+
+
+logger = getLogger('app')
+
+
+class RenderPoolError(Exception):
+    """Render pool error."""
+
+
+class RenderQueueFullError(RenderPoolError):
+    """Too many images are rendering or waiting for a worker."""
+
+
+class ReportRenderPool:
+    """Warm worker processes rendering report images out of the event loop.
+
+    Render functions get plain data and return PNG bytes. Requests over
+    workers + max_queue are rejected instead of piling up.
+    """
+
+    def __init__(self, workers: int, max_queue: int) -> None:
+        """Init render pool."""
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._rendered = 0
+        self._rejected = 0
+        self._broken = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=warm_up,
+            )
+        return self._executor
+
+    async def start(self) -> None:
+        """Spawn and warm up all workers."""
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(executor, os.getpid) for _ in range(self.workers)))
+        logger.info('report render pool started, workers %s', self.workers)
+
+    async def stop(self) -> None:
+        """Cancel queued renders and wait for workers exit."""
+        if self._executor is None:
+            return
+        executor, self._executor = self._executor, None
+        await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+
+    async def render(self, render: Callable[[dict], bytes], data: dict) -> bytes:
+        """Render image in worker process."""
+        if self._pending >= self.workers + self.max_queue:
+            self._rejected += 1
+            raise RenderQueueFullError(f'render queue is full, pending {self._pending}')
+
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+        self._pending += 1
+        try:
+            image = await loop.run_in_executor(executor, render, data)
+        except BrokenProcessPool as error:
+            self._broken += 1
+            if self._executor is executor:
+                logger.error('report render pool broken, recreate')
+                self._executor = None
+                executor.shutdown(wait=False, cancel_futures=True)
+            raise RenderPoolError('render worker died') from error
+        finally:
+            self._pending -= 1
+        self._rendered += 1
+        return image
+
+    def get_metrics(self) -> dict:
+        """Get pool metrics."""
+        return {
+            'pending': self._pending,
+            'rendered': self._rendered,
+            'rejected': self._rejected,
+            'broken': self._broken,
+        }
+
+
+render_pool = ReportRenderPool(workers=REPORT_RENDER_WORKERS, max_queue=REPORT_RENDER_MAX_QUEUE)
@@ -1,19 +1,20 @@
 from collections import defaultdict
 from dataclasses import dataclass
 import datetime
-from functools import cached_property
-from io import BytesIO
-from statistics import geometric_mean
-from typing import Literal, Optional
-
-import matplotlib.gridspec as gridspec
-import matplotlib.pyplot as plt
-import seaborn as sns
+from functools import cached_property, partial
+from typing import Callable, Literal, Optional
 
 from app.constants import USD_CODE, USDT_CODE
+from app.core.cache import LRUCache
+from app.core.config import REPORT_CACHE_SIZE, REPORT_FLIGHT_TTL
+from app.core.single_flight import SingleFlight
 from app.db_service import DatabaseAccessor
 from app.db_service.enums import BudgetItemTypeEnum
-from app.db_service.models import BudgetItem, Category, ChatBalance, ChatDebt, ChatFond, Valute, ValuteExchange
+from app.db_service.models import BudgetItem, Category, ChatBalance, ChatDebt, ChatFond, Valute
+
+from .rate_matrix import RateMatrix
+from .render import render_report, render_total_report
+from .render_pool import RenderPoolError, render_pool
 
 
 class ReportError(Exception):
@@ -32,6 +33,10 @@ class NoValuteError(ReportError):
     """Report valute error."""
 
 
+class ReportRenderError(ReportError):
+    """Report image render error."""
+
+
 @dataclass
 class ReportBudgetItem:
     """Report budget item."""
@@ -88,6 +93,7 @@ class _ReportBase:
 
     REPORT_IMAGE_WIDTH = 7
     REPORT_TEXT_FAMILY = 'monospace'
+    CACHED_FIELDS = ('image',)
 
     def __init__(self, db: 'DatabaseAccessor', chat_id: int, valute_code: str) -> None:
         """Init report base."""
@@ -110,77 +116,46 @@ class _ReportBase:
 
     async def _get_valute_rates(self, rates_to_find: set[Valute]) -> dict[str, dict[str, float]]:
         rates = defaultdict(lambda: {'avg': 0.0, 'cur': 0.0})
-        usd = await self.db.valute_repo.get_by_code(USD_CODE)
-
-        for valute in rates_to_find:
-            direct = await self._get_exchange_rate(valute, self.valute)
-            direct_cur = await self._get_exchange_rate(valute, self.valute, last_one=True)
+        if not rates_to_find:
+            return rates
+        codes = {v.code for v in rates_to_find} | {self.valute.code, USD_CODE}
+        matrix = await RateMatrix.load(
+            self.db, codes, self.period0, self.period1, self.VALUTE_SUBSTITUTES, self.RATE_PRECISION)
+        get_exchange_rate = matrix.get_exchange_rate
+        get_daily_rate = matrix.get_daily_rate
+
+        for code in (v.code for v in rates_to_find):
+            direct = get_exchange_rate(code, self.valute.code)
+            direct_cur = get_exchange_rate(code, self.valute.code, last_one=True)
             if direct:
-                rates[valute.code]['avg'] = direct
-                rates[valute.code]['cur'] = direct_cur
+                rates[code]['avg'] = direct
+                rates[code]['cur'] = direct_cur
                 continue
-            valute_to_usd = await self._get_exchange_rate(valute, usd)
-            usd_to_target = await self._get_exchange_rate(usd, valute)
-            valute_to_usd_cur = await self._get_exchange_rate(valute, usd, last_one=True)
-            usd_to_target_cur = await self._get_exchange_rate(usd, valute, last_one=True)
+            valute_to_usd = get_exchange_rate(code, USD_CODE)
+            usd_to_target = get_exchange_rate(USD_CODE, code)
+            valute_to_usd_cur = get_exchange_rate(code, USD_CODE, last_one=True)
+            usd_to_target_cur = get_exchange_rate(USD_CODE, code, last_one=True)
             if valute_to_usd and usd_to_target:
-                rates[valute.code]['avg'] = round(
+                rates[code]['avg'] = round(
                     valute_to_usd * usd_to_target, self.RATE_PRECISION)
-                rates[valute.code]['cur'] = round(
+                rates[code]['cur'] = round(
                     valute_to_usd_cur * usd_to_target_cur, self.RATE_PRECISION)
                 continue
-            valute_to_usd = await self._get_daily_rate(valute, usd)
-            valute_to_usd_cur = await self._get_daily_rate(valute, usd, last_one=True)
+            valute_to_usd = get_daily_rate(code, USD_CODE)
+            valute_to_usd_cur = get_daily_rate(code, USD_CODE, last_one=True)
             if self.valute.code in [USD_CODE, USDT_CODE]:
                 usd_to_target = 1
                 usd_to_target_cur = 1
             else:
-                usd_to_target = await self._get_daily_rate(usd, valute)
-                usd_to_target_cur = await self._get_daily_rate(usd, valute, last_one=True)
+                usd_to_target = get_daily_rate(USD_CODE, code)
+                usd_to_target_cur = get_daily_rate(USD_CODE, code, last_one=True)
             if valute_to_usd and usd_to_target:
-                rates[valute.code]['avg'] = round(
+                rates[code]['avg'] = round(
                     valute_to_usd * usd_to_target, self.RATE_PRECISION)
-                rates[valute.code]['cur'] = round(
+                rates[code]['cur'] = round(
                     valute_to_usd_cur * usd_to_target_cur, self.RATE_PRECISION)
         return rates
 
-    async def _get_exchange_rate(
-            self, valute_from: Valute, valute_to: Valute,
-            last_one: bool = False) -> Optional[float]:
-        rates = []
-        from_codes = [valute_from.code] + self.VALUTE_SUBSTITUTES.get(valute_from.code, [])
-        to_codes = [valute_to.code] + self.VALUTE_SUBSTITUTES.get(valute_to.code, [])
-        exchanges: list[ValuteExchange] = await self.db.valute_exchange_repo.get_pair_exchanges(
-            from_codes, to_codes, self.period0, self.period1, last_one=last_one)
-        for exchange in exchanges:
-            rate = round(
-                exchange.valute_to_amount / exchange.valute_from_amount, self.RATE_PRECISION)
-            rates.append(rate)
-        exchanges = await self.db.valute_exchange_repo.get_pair_exchanges(
-            to_codes, from_codes, self.period0, self.period1, last_one=last_one)
-        for exchange in exchanges:
-            rate = round(
-                exchange.valute_from_amount / exchange.valute_to_amount, self.RATE_PRECISION)
-            rates.append(rate)
-        return geometric_mean(rates) if rates else None
-
-    async def _get_daily_rate(
-            self, valute_from: Valute, valute_to: Valute,
-            last_one: bool = False) -> Optional[float]:
-        rates = []
-        from_codes = [valute_from.code] + self.VALUTE_SUBSTITUTES.get(valute_from.code, [])
-        to_codes = [valute_to.code] + self.VALUTE_SUBSTITUTES.get(valute_to.code, [])
-        daily_rates = await self.db.valute_rate_repo.get_period_rates(
-            from_codes, to_codes, self.period0, self.period1, last_one=last_one)
-        for rate in daily_rates:
-            rates.append(rate.rate)
-        daily_rates = await self.db.valute_rate_repo.get_period_rates(
-            to_codes, from_codes, self.period0, self.period1, last_one=last_one)
-        for rate in daily_rates:
-            rate = round(1 / rate.rate, self.RATE_PRECISION)
-            rates.append(rate)
-        return geometric_mean(rates) if rates else None
-
     async def _load_rates(self, used_valutes: set[Valute]) -> None:
         """Load rates."""
         substitutes = self.VALUTE_SUBSTITUTES.get(self.valute.code, [])
@@ -199,6 +174,43 @@ class _ReportBase:
         rates.update({self.valute.code: default_rate})
         self.rates = rates
 
+    async def _get_cache_key(self) -> Optional[tuple]:
+        """Cache key: report kind, chat, period, report valute and chat data version.
+
+        Versions are stored in database, so writes of any bot instance change the key.
+        """
+        if (version := await self.db.data_version_repo.get_version(self.chat_id)) is None:
+            return None
+        return (
+            self.__class__.__name__, self.chat_id, self.period0, self.period1, self.valute_code, version,
+        )
+
+    async def calculate(self) -> None:
+        """Calculate report, take it from cache or join the same report calculation in flight."""
+        if (cache_key := await self._get_cache_key()) is None:
+            await self._calculate()
+            return
+        if (fields := report_cache.get(cache_key)) is None:
+            fields = await report_flights.do(cache_key, partial(self._calculate_cached, cache_key))
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    async def _calculate_cached(self, cache_key: tuple) -> dict:
+        await self._calculate()
+        fields = {name: getattr(self, name) for name in self.CACHED_FIELDS}
+        report_cache.set(cache_key, fields)
+        return fields
+
+    async def _calculate(self) -> None:
+        raise NotImplementedError
+
+    async def _render_image(self, render: Callable[[dict], bytes], data: dict) -> None:
+        """Render image in render pool worker."""
+        try:
+            self.image = await render_pool.render(render, data)
+        except RenderPoolError as error:
+            raise ReportRenderError(str(error)) from error
+
 
 class Report(_ReportBase):
     """Budget Report."""
@@ -212,6 +224,7 @@ class Report(_ReportBase):
 
     PIE_CHART_HEIGHT = 5
     LEGEND_ITEM_HEIGHT = 0.2
+    CACHED_FIELDS = ('image', 'result')
 
     def __init__(self, valute_code: str, chat_id: int, period0: datetime.date,
                  period1: datetime.date, db: 'DatabaseAccessor') -> None:
@@ -356,84 +369,44 @@ class Report(_ReportBase):
             )
             self.categories.append(category)
 
-    def _make_report_image(self) -> bytes:
+    async def _make_report_image(self) -> None:
         """Generate report image."""
-        fig = plt.figure(figsize=(self.REPORT_IMAGE_WIDTH, self.image_height))
-        gs = fig.add_gridspec(
-            2, 1, height_ratios=[self.income_section_height, self.expense_section_height])
-        for gs, categories, budget_item_type in (
-            (gs[0], self.income_categories, BudgetItemTypeEnum.INCOME),
-            (gs[1], self.expense_categories, BudgetItemTypeEnum.EXPENSE),
+        sections = []
+        for title, height, legend_height, categories, budget_item_type in (
+            (self.income_title, self.income_section_height, self.income_legend_height,
+             self.income_categories, BudgetItemTypeEnum.INCOME),
+            (self.expense_title, self.expense_section_height, self.expense_legend_height,
+             self.expense_categories, BudgetItemTypeEnum.EXPENSE),
         ):
-            self._create_section_plot(fig, gs, categories, budget_item_type)
-        plt.tight_layout(pad=2.0)
-        buf = BytesIO()
-        plt.savefig(buf, format='png', bbox_inches='tight', pad_inches=0.2, dpi=100)
-        plt.close(fig)
-        image_bytes = buf.getvalue()
-        buf.close()
-        self.image = image_bytes
-
-    def _create_section_plot(
-            self, fig: plt.Figure, subplot_pos: gridspec.GridSpec,
-            categories: list[ReportCategory],
-            budget_item_type: BudgetItemTypeEnum, palette='deep') -> None:
-        """Create a section of the report with title, pie chart and legend."""
-        if not categories:
-            return
-
-        if budget_item_type == BudgetItemTypeEnum.INCOME:
-            category_totals = [c.income for c in categories]
-            legend_height = self.income_legend_height
-            pie_labels = [f'{c.name} [{c.income_str}]' for c in categories]
-            title = self.income_title
-        else:
-            category_totals = [c.expense for c in categories]
-            legend_height = self.expense_legend_height
-            pie_labels = [f'{c.name} [{c.expense_str}]' for c in categories]
-            title = self.expense_title
-
-        gs = gridspec.GridSpecFromSubplotSpec(
-            2, 1, subplot_pos, height_ratios=[self.PIE_CHART_HEIGHT, legend_height])
-        pie_ax = fig.add_subplot(gs[0])
-        colors = sns.color_palette(palette, n_colors=len(categories))
-        pie_ax.pie(
-            category_totals, labels=pie_labels, colors=colors, autopct='%1.1f%%', startangle=90)
-        pie_ax.set_title(title, fontsize=14, pad=20)
-        legend_ax = fig.add_subplot(gs[1])
-        legend_ax.axis('off')
-        legend_items = []
-        for category, color in zip(categories, colors):
-            for item in [i for i in category.budget_items if i.type_ == budget_item_type]:
-                formatted_text = (
-                    f'{category.name.upper():{self.max_category_name_length}} '
-                    f'| {item.name:{self.max_item_name_length}} | {item.amount_str}'
-                )
-                legend_items.append((color, formatted_text, item.amount))
-        legend_items.sort(key=lambda x: x[2], reverse=True)
-
-        item_count = len(legend_items)
-        available_height = 0.9
-        line_spacing = available_height / item_count if item_count > 0 else 0.05
-        y_pos = 0.95
-        for color, label, _ in legend_items:
-            legend_ax.text(
-                0.1, y_pos,
-                label,
-                fontsize=9,
-                color=color,
-                transform=legend_ax.transAxes,
-                family='monospace',
-            )
-            y_pos -= line_spacing
-
-    async def calculate(self) -> bytes:
+            is_income = budget_item_type == BudgetItemTypeEnum.INCOME
+            sections.append({
+                'title': title,
+                'height': height,
+                'legend_height': legend_height,
+                'categories': [{
+                    'name': c.name,
+                    'total': c.income if is_income else c.expense,
+                    'total_str': c.income_str if is_income else c.expense_str,
+                    'items': [(i.name, i.amount, i.amount_str)
+                              for i in c.budget_items if i.type_ == budget_item_type],
+                } for c in categories],
+            })
+        data = {
+            'width': self.REPORT_IMAGE_WIDTH,
+            'pie_chart_height': self.PIE_CHART_HEIGHT,
+            'max_category_name_length': self.max_category_name_length,
+            'max_item_name_length': self.max_item_name_length,
+            'sections': sections,
+        }
+        await self._render_image(render_report, data)
+
+    async def _calculate(self) -> None:
         """Load, calculate data and make report image."""
         await self._load_valute()
         await self._load_raw_data()
         await self._load_rates(used_valutes=set(v for _, _, v, _ in self.raw_data))
         await self._convert_raw_data()
-        self._make_report_image()
+        await self._make_report_image()
 
 
 class ReportTotal(_ReportBase):
@@ -459,6 +432,7 @@ class ReportTotal(_ReportBase):
     }
 
     IMAGE_LINE_HEIGHT = 0.12
+    CACHED_FIELDS = ('image', 'income', 'outcome', 'period0', 'period1')
 
     def __init__(self, db: 'DatabaseAccessor', chat_id: int, valute_code: str,
                  balances: list[ChatBalance], fonds: list[ChatFond],
@@ -618,14 +592,14 @@ class ReportTotal(_ReportBase):
             self.IMAGE_LINE_HEIGHT
             * (len(self.report_lines) + space_rows))
 
-    async def calculate(self) -> Optional[bytes]:
+    async def _calculate(self) -> None:
         """Calculate and make report image."""
         await self._load_valute()
         await self._load_period()
         used_valutes = await self.db.entry_repo.get_chat_entries_valutes(chat_id=self.chat_id)
         await self._load_rates(used_valutes=used_valutes)
         await self._calculate_entries()
-        self._make_report_image()
+        await self._make_report_image()
 
     async def load_rates(self) -> None:
         """Load rates."""
@@ -646,82 +620,32 @@ class ReportTotal(_ReportBase):
         """Calculate income and outcome in report valute."""
         income = 0
         outcome = 0
-        async for row in self.db.entry_repo.iterate_chat_entries(chat_id=self.chat_id):
-            entry_type, amount, valute_code, rate = row
-            if (
-                self.valute.code in self.VALUTE_SUBSTITUTES
-                and valute_code in self.VALUTE_SUBSTITUTES[self.valute.code]
-            ):
-                rate = 1
-            elif valute_code == self.valute.code:
-                rate = 1
-            else:
-                rate = 1 / rate
+        totals = await self.db.entry_repo.get_chat_entries_totals(chat_id=self.chat_id)
+        if totals is None:
+            raise ReportError('entries totals not loaded')
+        substitutes = self.VALUTE_SUBSTITUTES.get(self.valute.code, [])
+        for entry_type, valute_code, amount, amount_converted, no_rate_count in totals:
+            if valute_code != self.valute.code and valute_code not in substitutes:
+                if no_rate_count:
+                    raise NoRatesError(f'rates not found for {no_rate_count} {valute_code} entries')
+                amount = amount_converted
             if entry_type == BudgetItemTypeEnum.INCOME:
-                income += amount * rate
+                income += amount
             else:
-                outcome += amount * rate
+                outcome += amount
         self.income, self.outcome = income, outcome
 
-    def _make_report_image(self) -> bytes:
+    async def _make_report_image(self) -> None:
         """Make report image."""
-        title_line = self.report_lines[0]
-        headers_line = self.report_lines[1]
-        no_title_lines = self.report_lines[1:]
-        no_title_no_header_lines = self.report_lines[2:]
-        label_width = max(len(label) for label, *_ in no_title_lines)
-        column_1_width = max(len(str(amount)) for _, amount, *_ in no_title_lines if amount)
-        column_2_width = max(len(str(amount)) for _, _, amount, *_ in no_title_lines if amount)
-        title_line_str = title_line[0]
-        title_color = title_line[-1]
-        title_font_size = 14
-        row_font_size = 13
-
-        fig, ax = plt.subplots(figsize=(self.REPORT_IMAGE_WIDTH, self.image_height))
-        ax.axis('off')
-
-        y = self.image_height - self.IMAGE_LINE_HEIGHT
-        ax.text(
-            0, y, title_line_str, fontsize=title_font_size, va='center', ha='left',
-            family=self.REPORT_TEXT_FAMILY, color=title_color)
-        y -= self.IMAGE_LINE_HEIGHT * 2
-
-        headers_label, headers_col1, headers_col2, headers_color = headers_line
-        headers_text = (
-            f'{headers_label:<{label_width}} | '
-            f'{headers_col1:<{column_1_width}} | '
-            f'{headers_col2:<{column_2_width}}'
-        )
-        ax.text(
-            0, y, headers_text, fontsize=row_font_size, va='center', ha='left',
-            family=self.REPORT_TEXT_FAMILY, color=headers_color, weight='bold')
-        y -= self.IMAGE_LINE_HEIGHT
-
-        for i, (label, cur_amount, valute_amount, color) in enumerate(no_title_no_header_lines):
-            text = f'{label:<{label_width}}'
-            is_subtitle = cur_amount is None and valute_amount is None
-            if is_subtitle:
-                if i > 0:
-                    y -= self.IMAGE_LINE_HEIGHT
-                text = text.upper()
-                ax.text(
-                    0, y, text, fontsize=row_font_size, va='center', ha='left',
-                    family=self.REPORT_TEXT_FAMILY, color=color)
-            else:
-                text = [text]
-                for value, width in zip([cur_amount, valute_amount],
-                                        [column_1_width, column_2_width]):
-                    value_s = f'{value:>{width}.2f}' if value is not None else f'{"":<{width}}'
-                    text.append(value_s)
-                text = ' | '.join(text)
-                ax.text(
-                    0, y, text, fontsize=row_font_size, va='center', ha='left',
-                    family=self.REPORT_TEXT_FAMILY, color=color)
-            y -= self.IMAGE_LINE_HEIGHT
-
-        buf = BytesIO()
-        plt.savefig(buf, format='png', bbox_inches='tight', pad_inches=0.2, dpi=100)
-        plt.close(fig)
-        image_bytes = buf.getvalue()
-        buf.close()
-        self.image = image_bytes
+        data = {
+            'width': self.REPORT_IMAGE_WIDTH,
+            'image_height': self.image_height,
+            'line_height': self.IMAGE_LINE_HEIGHT,
+            'family': self.REPORT_TEXT_FAMILY,
+            'lines': self.report_lines,
+        }
+        await self._render_image(render_total_report, data)
+
+
+report_cache = LRUCache(REPORT_CACHE_SIZE)
+report_flights = SingleFlight(ttl=REPORT_FLIGHT_TTL)
@@ -0,0 +1,94 @@
+from collections import OrderedDict
+import time
+from typing import Any, Callable, Hashable, Optional
+
+
+class CacheStats:
+    """Cache usage counters."""
+
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'expirations': self.expirations, 'hit_ratio': round(self.hit_ratio, 4)}
+
+
+class LRUCache:
+    """Size bounded LRU cache with optional entries time to live.
+
+    `on_evict` is called with key and value of every evicted or expired entry.
+    """
+
+    maxsize: int
+    ttl: Optional[float]
+    stats: CacheStats
+
+    _MISSING = object()
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None,
+                 on_evict: Optional[Callable[[Hashable, Any], None]] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.stats = CacheStats()
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get value and mark it as recently used."""
+        value = self._get(key)
+        if value is self._MISSING:
+            self.stats.misses += 1
+            return default
+        self.stats.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store value evicting least recently used ones over the size limit."""
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            evicted_key, (_, evicted) = self._data.popitem(last=False)
+            self.stats.evictions += 1
+            if self.on_evict:
+                self.on_evict(evicted_key, evicted)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove value."""
+        value = self._data.pop(key, None)
+        return default if value is None else value[1]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def _get(self, key: Hashable) -> Any:
+        if (item := self._data.get(key)) is None:
+            return self._MISSING
+        expires_at, value = item
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            self.stats.expirations += 1
+            if self.on_evict:
+                self.on_evict(key, value)
+            return self._MISSING
+        self._data.move_to_end(key)
+        return value
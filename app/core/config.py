@@ -1,5 +1,5 @@
 import pathlib
-from environs import Env
+from environs import Env, validate
 
 
 env = Env()
@@ -27,11 +27,109 @@ with env.prefixed('POSTGRES_'):
     name = env('DB')
 DATABASE_URL = f'postgresql+asyncpg://{user}:{password}@{host}:{port}/{name}'
 APSCHEDULER_DB_URL = f'postgresql+psycopg2://{user}:{password}@{host}:{port}/{name}'
+# one session per processed update, its writes are committed before every request to Telegram
+DB_UNIT_OF_WORK = env.bool('DB_UNIT_OF_WORK', False)
+
+# scheduler jobs are defined in code, memory job store keeps their state off the event loop,
+# sqlalchemy one is the synchronous APScheduler store over APSCHEDULER_DB_URL
+SCHEDULER_JOB_STORE = env.str(
+    'SCHEDULER_JOB_STORE', 'memory', validate=lambda value: value in ('memory', 'sqlalchemy'))
+
+# caches
+CONTEXT_CACHE_SIZE = env.int('CONTEXT_CACHE_SIZE', 1000)
+CONTEXT_CACHE_TTL = env.float('CONTEXT_CACHE_TTL', ONE_MINUTE * 10)
+REPORT_CACHE_SIZE = env.int('REPORT_CACHE_SIZE', 200)
+# finished report calculation is shared with the same report requests arriving meanwhile
+REPORT_FLIGHT_TTL = env.float('REPORT_FLIGHT_TTL', 10)
+
+# report images rendering
+REPORT_RENDER_WORKERS = env.int('REPORT_RENDER_WORKERS', 2)
+REPORT_RENDER_MAX_QUEUE = env.int('REPORT_RENDER_MAX_QUEUE', 10)
+
+# rates
+RATES_PROVIDER_CONCURRENCY = env.int('RATES_PROVIDER_CONCURRENCY', 4)
+RATES_REQUEST_TIMEOUT = env.float('RATES_REQUEST_TIMEOUT', 15)
+# failed rate lookup is retried after delay doubled by every attempt
+RATES_RETRY_DELAY = env.float('RATES_RETRY_DELAY', ONE_MINUTE * 15)
+RATES_RETRY_MAX_DELAY = env.float('RATES_RETRY_MAX_DELAY', ONE_WEEK)
 
 # telegram
 TG_TOKEN = env('TG_TOKEN')
 TG_BASE_URL = f'https://api.telegram.org/bot{TG_TOKEN}'
 POLLER_REQUEST_TIMEOUT = env.int('POLLER_REQUEST_TIMEOUT', 60)
+# only update kinds handled by accountant are requested from Telegram
+TG_ALLOWED_UPDATES = ['message', 'callback_query']
+
+TG_UPDATES_MODE = env.str(
+    'TG_UPDATES_MODE', 'polling', validate=lambda value: value in ('polling', 'webhook'))
+
+# telegram webhook, url and secret are required in webhook mode,
+# the secret has to be the same for all bot instances sharing the webhook
+_WEBHOOK_REQUIRED = {} if TG_UPDATES_MODE == 'webhook' else {'default': None}
+TG_WEBHOOK_URL = env.str('TG_WEBHOOK_URL', **_WEBHOOK_REQUIRED)
+TG_WEBHOOK_HOST = env.str('TG_WEBHOOK_HOST', '0.0.0.0')
+TG_WEBHOOK_PORT = env.int('TG_WEBHOOK_PORT', 8080)
+TG_WEBHOOK_PATH = env.str('TG_WEBHOOK_PATH', '/webhook')
+TG_WEBHOOK_SECRET = env.str(
+    'TG_WEBHOOK_SECRET', validate=validate.Regexp(r'^[A-Za-z0-9_-]{1,256}$'), **_WEBHOOK_REQUIRED)
+
+# telegram http pool
+TG_HTTP2 = env.bool('TG_HTTP2', False)
+TG_POOL_MAX_CONNECTIONS = env.int('TG_POOL_MAX_CONNECTIONS', 20)
+TG_POOL_MAX_KEEPALIVE_CONNECTIONS = env.int('TG_POOL_MAX_KEEPALIVE_CONNECTIONS', 10)
+TG_POOL_KEEPALIVE_EXPIRY = env.float('TG_POOL_KEEPALIVE_EXPIRY', 30)
+TG_CONNECT_TIMEOUT = env.float('TG_CONNECT_TIMEOUT', 10)
+TG_DEFAULT_REQUEST_TIMEOUT = env.float('TG_DEFAULT_REQUEST_TIMEOUT', 30)
+TG_METHOD_TIMEOUTS = env.dict(
+    'TG_METHOD_TIMEOUTS',
+    subcast_values=float,
+    default={'getUpdates': POLLER_REQUEST_TIMEOUT * 2, 'sendPhoto': 60},
+)
+
+# telegram send tasks deadlines, a task not sent by then resolves with timeout and is dropped
+TG_SEND_DEFAULT_DEADLINE = env.float('TG_SEND_DEFAULT_DEADLINE', ONE_MINUTE * 2)
+TG_SEND_DEADLINES = env.dict(
+    'TG_SEND_DEADLINES',
+    subcast_values=float,
+    default={'sendPhoto': ONE_MINUTE * 3},
+)
+
+# telegram sent photos file_id, identical photos are sent by file_id without upload
+TG_PHOTO_FILE_ID_CACHE_SIZE = env.int('TG_PHOTO_FILE_ID_CACHE_SIZE', 500)
+TG_PHOTO_FILE_ID_TTL = env.float('TG_PHOTO_FILE_ID_TTL', ONE_DAY)
+
+# telegram last sent edits by message, edit to the same content is not sent again
+TG_SENT_EDITS_CACHE_SIZE = env.int('TG_SENT_EDITS_CACHE_SIZE', 1000)
+TG_SENT_EDITS_TTL = env.float('TG_SENT_EDITS_TTL', ONE_HOUR)
+
+# telegram updates processing
+TG_MANAGERS_COUNT = env.int('TG_MANAGERS_COUNT', 4)
+TG_UPDATES_SHARD_BY = env.str(
+    'TG_UPDATES_SHARD_BY', 'chat', validate=lambda value: value in ('chat', 'user'))
+
+# telegram flood control
+TG_SENDERS_COUNT = env.int('TG_SENDERS_COUNT', 4)
+TG_GLOBAL_RATE = env.float('TG_GLOBAL_RATE', 30)
+TG_GLOBAL_BURST = env.float('TG_GLOBAL_BURST', 30)
+TG_CHAT_RATE = env.float('TG_CHAT_RATE', 1)
+TG_CHAT_BURST = env.float('TG_CHAT_BURST', 3)
+TG_GROUP_RATE_PER_MINUTE = env.float('TG_GROUP_RATE_PER_MINUTE', 20)
+TG_GROUP_BURST = env.float('TG_GROUP_BURST', 20)
+
+# telegram send lanes: interactive replies and edits, cleanup deletions and media uploads,
+# lanes concurrency limits keep senders free for interactive requests during uploads,
+# so other lanes together must leave at least one sender,
+# a lane not served for max wait goes first whatever its priority is
+TG_LANE_LIMITS = env.dict(
+    'TG_LANE_LIMITS',
+    subcast_values=int,
+    default={'interactive': 4, 'cleanup': 1, 'media': 1},
+)
+if sum(limit for lane, limit in TG_LANE_LIMITS.items() if lane != 'interactive') >= TG_SENDERS_COUNT:
+    raise ValueError(f'TG_LANE_LIMITS {TG_LANE_LIMITS} leave no sender of {TG_SENDERS_COUNT} to interactive lane')
+TG_LANE_MAX_WAIT = env.float('TG_LANE_MAX_WAIT', 2)
+# batched requests, e.g. deletions, of an idle chat wait this long to gather more
+TG_BATCH_WINDOW = env.float('TG_BATCH_WINDOW', 0.1)
 
 LOGGER_CONFIG = {
     'version': 1,
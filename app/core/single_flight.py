@@ -0,0 +1,45 @@
+import asyncio
+import contextvars
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one in-flight call.
+
+    The call runs as a separate task, so a cancelled caller does not cancel it
+    for the others, result or error is delivered to every caller. Successful
+    result is kept for `ttl` seconds, so callers arriving just after the call
+    finished, e.g. processed one by one in the same update shard, share it too.
+    """
+
+    shared_count: int
+
+    def __init__(self, ttl: float = 0) -> None:
+        self.ttl = ttl
+        self.shared_count = 0
+        self._calls: dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, function: Callable[[], Awaitable[Any]]) -> Any:
+        """Await function result, joining the call in flight for the key if any."""
+        if (task := self._calls.get(key)) is None:
+            # empty context, so the call does not use unit of work or other state of the first caller
+            task = asyncio.create_task(function(), context=contextvars.Context())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._on_done(key, done))
+        else:
+            self.shared_count += 1
+        return await asyncio.shield(task)
+
+    def _on_done(self, key: Hashable, task: asyncio.Task) -> None:
+        # retrieved here, so error of a call left by all callers is not reported as lost
+        if task.cancelled() or task.exception() is not None or not self.ttl:
+            self._forget(key, task)
+        else:
+            asyncio.get_running_loop().call_later(self.ttl, self._forget, key, task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
@@ -0,0 +1,89 @@
+from typing import Optional
+
+from app.core.cache import LRUCache
+from app.core.config import CONTEXT_CACHE_SIZE, CONTEXT_CACHE_TTL
+
+from .models import (
+    ChatBalance,
+    ChatBudgetItem,
+    ChatDebt,
+    ChatFond,
+    ChatValute,
+    TGChat,
+    TGUser,
+    TGUserState,
+    _Base,
+)
+
+
+class ContextCache:
+    """Update processing context cache: chat aggregates, users and user states.
+
+    Repositories invalidate entries explicitly on every write touching them.
+    """
+
+    CHAT_AGGREGATE_MODELS = (ChatBudgetItem, ChatValute, ChatBalance, ChatFond, ChatDebt)
+
+    chats: LRUCache
+    users: LRUCache
+    states: LRUCache
+
+    def __init__(self, maxsize: int, ttl: Optional[float]) -> None:
+        self.chats = LRUCache(maxsize, ttl, on_evict=self._forget_chat_tg_id)
+        self.users = LRUCache(maxsize, ttl)
+        self.states = LRUCache(maxsize, ttl)
+        self._chat_tg_ids: dict[int, int] = {}
+
+    def get_chat(self, tg_id: int) -> Optional[TGChat]:
+        return self.chats.get(tg_id)
+
+    def set_chat(self, chat: TGChat) -> None:
+        self._chat_tg_ids[chat.id] = chat.tg_id
+        self.chats.set(chat.tg_id, chat)
+
+    def invalidate_chat(self, chat_id: int) -> None:
+        """Drop chat aggregate by chat database id."""
+        if (tg_id := self._chat_tg_ids.pop(chat_id, None)) is not None:
+            self.chats.pop(tg_id)
+
+    def _forget_chat_tg_id(self, tg_id: int, chat: TGChat) -> None:
+        """Drop tg id of chat evicted from cache, so the index is bounded by the cache size."""
+        if self._chat_tg_ids.get(chat.id) == tg_id:
+            del self._chat_tg_ids[chat.id]
+
+    def get_user(self, tg_id: int) -> Optional[TGUser]:
+        return self.users.get(tg_id)
+
+    def set_user(self, user: TGUser) -> None:
+        self.users.set(user.tg_id, user)
+
+    def get_state(self, tg_user_id: int) -> Optional[TGUserState]:
+        return self.states.get(tg_user_id)
+
+    def set_state(self, state: TGUserState) -> None:
+        self.states.set(state.tg_user_id, state)
+
+    def on_write(self, item: _Base, result: Optional[_Base]) -> None:
+        """Refresh or drop cached context touched by written item."""
+        if isinstance(item, TGUserState):
+            if result:
+                self.set_state(result)
+            else:
+                self.states.pop(item.tg_user_id)
+        elif isinstance(item, TGUser):
+            self.users.pop(item.tg_id)
+        elif isinstance(item, TGChat):
+            self.invalidate_chat(item.id)
+        elif isinstance(item, self.CHAT_AGGREGATE_MODELS):
+            self.invalidate_chat(item.chat_id)
+
+    def get_metrics(self) -> dict:
+        """Get hit ratio and eviction counters of every cache."""
+        return {
+            'chats': self.chats.stats.as_dict(),
+            'users': self.users.stats.as_dict(),
+            'states': self.states.stats.as_dict(),
+        }
+
+
+context_cache = ContextCache(maxsize=CONTEXT_CACHE_SIZE, ttl=CONTEXT_CACHE_TTL)
@@ -43,6 +43,7 @@ class ChatBudgetItem(_BaseExtended):
         sa.BigInteger,
         sa.ForeignKey('tg_chats.id', ondelete='CASCADE'),
         nullable=False,
+        index=True,
     )
 
     __table_args__ = (
@@ -58,7 +59,7 @@ class TGChat(_BaseExtended):
 
     __tablename__ = 'tg_chats'
 
-    tg_id = sa.Column(sa.BigInteger, nullable=False)
+    tg_id = sa.Column(sa.BigInteger, nullable=False, index=True)
     title = sa.Column(sa.String, nullable=True)
     type = sa.Column(sa.String(30), nullable=False)
 
@@ -90,7 +91,7 @@ class TGUser(_BaseExtended):
     """Telegram users."""
     __tablename__ = 'tg_users'
 
-    tg_id = sa.Column(sa.BigInteger(), nullable=False)
+    tg_id = sa.Column(sa.BigInteger(), nullable=False, index=True)
     first_name = sa.Column(sa.String)
     username = sa.Column(sa.String)
     is_bot = sa.Column(sa.Boolean, nullable=False)
@@ -144,6 +145,7 @@ class TGUserState(_BaseExtended):
         sa.BigInteger,
         sa.ForeignKey('tg_users.id', ondelete='CASCADE'),
         nullable=False,
+        index=True,
     )
     name: Mapped[str] = mapped_column(sa.String, nullable=False)
     data_raw = sa.Column(JSONB, nullable=False, default=dict())
@@ -205,6 +207,45 @@ class Entry(_BaseExtended):
     )
     amount = sa.Column(sa.Float, nullable=False)
     data_raw = sa.Column(JSONB, nullable=False, default=dict())
+    chat_id = sa.Column(
+        sa.BigInteger,
+        sa.ForeignKey('tg_chats.id', ondelete='CASCADE'),
+        nullable=False,
+    )
+    message_id = sa.Column(sa.BigInteger, nullable=True)
+
+    __table_args__ = (
+        sa.Index('ix_entries_chat_budget_item_id_created_at', 'chat_budget_item_id', 'created_at'),
+        sa.Index('ix_entries_chat_id_message_id', 'chat_id', 'message_id'),
+    )
+
+
+class EntryMonthTotal(_Base):
+    """Entries amount and count rolled up by chat, month, budget item and valute."""
+
+    __tablename__ = 'entry_month_totals'
+
+    chat_id = sa.Column(
+        sa.BigInteger,
+        sa.ForeignKey('tg_chats.id', ondelete='CASCADE'),
+        nullable=False,
+        primary_key=True,
+    )
+    month = sa.Column(sa.Date, nullable=False, primary_key=True)
+    chat_budget_item_id = sa.Column(
+        sa.BigInteger,
+        sa.ForeignKey('chat_budget_items.id', ondelete='CASCADE'),
+        nullable=False,
+        primary_key=True,
+    )
+    valute_id = sa.Column(
+        sa.BigInteger,
+        sa.ForeignKey('valutes.id', ondelete='CASCADE'),
+        nullable=False,
+        primary_key=True,
+    )
+    amount = sa.Column(sa.Float, nullable=False, server_default=sa.text('0'))
+    entries_count = sa.Column(sa.Integer, nullable=False, server_default=sa.text('0'))
 
 
 class ValuteRate(_Base):
@@ -225,6 +266,71 @@ class ValuteRate(_Base):
     rate = sa.Column(sa.Float, nullable=False)
     date = sa.Column(sa.Date, nullable=False, server_default=text('CURRENT_DATE'), primary_key=True)
 
+    __table_args__ = (
+        sa.Index('ix_valute_rates_valute_to_id_date', 'valute_to_id', 'date'),
+    )
+
+
+class ValuteRateWatermark(_Base):
+    """Valute whose entries, balances and debts history was looked up for rates.
+
+    Dates written later come from the rate date queue.
+    """
+
+    __tablename__ = 'valute_rate_watermarks'
+
+    valute_id = sa.Column(
+        sa.BigInteger,
+        sa.ForeignKey('valutes.id', ondelete='CASCADE'),
+        nullable=False,
+        primary_key=True,
+    )
+
+
+class RateDateQueue(_Base):
+    """Dates of written entries, balances and debts waiting for rates lookup."""
+
+    __tablename__ = 'rate_date_queue'
+
+    date = sa.Column(sa.Date, nullable=False, primary_key=True)
+
+
+class ValuteRateFailure(_Base):
+    """Failed valute rate lookup, retried after exponentially growing delay."""
+
+    __tablename__ = 'valute_rate_failures'
+
+    valute_id = sa.Column(
+        sa.BigInteger,
+        sa.ForeignKey('valutes.id', ondelete='CASCADE'),
+        nullable=False,
+        primary_key=True,
+    )
+    date = sa.Column(sa.Date, nullable=False, primary_key=True)
+    attempts = sa.Column(sa.Integer, nullable=False, server_default=sa.text('1'))
+    retry_at = sa.Column(sa.DateTime(timezone=True), nullable=False)
+
+
+class DataVersion(_Base):
+    """Version of report source data: chat data by chat scope, rates by rates scope.
+
+    Bumped in the transaction writing the data, shared by bot instances.
+    """
+
+    __tablename__ = 'data_versions'
+
+    scope = sa.Column(sa.String, nullable=False, primary_key=True)
+    version = sa.Column(sa.BigInteger, nullable=False, server_default=sa.text('1'))
+
+
+class SchedulerJobRun(_Base):
+    """Last run of scheduler job by any bot instance."""
+
+    __tablename__ = 'scheduler_job_runs'
+
+    job_id = sa.Column(sa.String, nullable=False, primary_key=True)
+    last_run_at = sa.Column(sa.DateTime(timezone=True), nullable=False, server_default=func.now())
+
 
 class ValuteExchange(_BaseExtended):
     __tablename__ = 'valute_exchanges'
@@ -247,6 +353,11 @@ class ValuteExchange(_BaseExtended):
     valute_from_amount = sa.Column(sa.Float, nullable=False)
     valute_to_amount = sa.Column(sa.Float, nullable=False)
 
+    __table_args__ = (
+        sa.Index('ix_valute_exchanges_valutes_created_at',
+                 'valute_from_id', 'valute_to_id', 'created_at'),
+    )
+
 
 class _BalanceItem(_BaseExtended):
     """Base model for balance, fond and debts items."""
@@ -257,6 +368,7 @@ class _BalanceItem(_BaseExtended):
         sa.BigInteger,
         sa.ForeignKey('tg_chats.id', ondelete='CASCADE'),
         nullable=False,
+        index=True,
     )
     name = sa.Column(sa.String, nullable=False)
     amount = sa.Column(sa.Float, nullable=False, server_default=sa.text('0'))
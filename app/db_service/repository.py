@@ -1,15 +1,20 @@
 import datetime
-from functools import wraps
+from functools import partial, wraps
 from logging import getLogger
-from typing import AsyncIterator, List, Optional, Type, TypeVar
+from typing import Callable, List, Optional, Type, TypeVar
 
-from sqlalchemy import Column, Date, Integer, and_, asc, cast, desc, func, true
+from sqlalchemy import (
+    Date, Integer, and_, asc, cast, delete, desc, exists, func, literal, literal_column, text, true, tuple_, union,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import Load, aliased, contains_eager, joinedload
+from sqlalchemy.orm import Load, aliased, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
 from app.db_service.enums import BudgetItemTypeEnum
 
+from .cache import context_cache
 from .models import (
     BudgetItem,
     Category,
@@ -18,26 +23,56 @@ from .models import (
     ChatDebt,
     ChatFond,
     ChatValute,
+    DataVersion,
     Entry,
+    EntryMonthTotal,
+    RateDateQueue,
+    SchedulerJobRun,
     TGChat,
     TGUser,
     TGUserState,
     Valute,
     ValuteExchange,
     ValuteRate,
+    ValuteRateFailure,
+    ValuteRateWatermark,
     _Base,
 )
-from .session import session_factory
+from .session import get_unit_of_work, session_factory
 
 
 logger = getLogger('db')
 T = TypeVar('T', bound=_Base)
 
+# dates valute rates are needed for
+RATED_DATE_COLUMNS = {
+    Entry: Entry.created_at,
+    ChatBalance: ChatBalance.updated_at,
+    ChatDebt: ChatDebt.updated_at,
+}
+# writes of these models change reports of item chat or reports using rates
+CHAT_VERSIONED_MODELS = (Entry, ChatBudgetItem, ChatBalance, ChatFond, ChatDebt)
+RATES_VERSIONED_MODELS = (ValuteRate, ValuteExchange)
+RATES_VERSION_SCOPE = 'rates'
+
 
 def handle_session(function):
-    """Provide session to function."""
+    """Provide session to function.
+
+    Inside a unit of work its session is joined and errors are raised to
+    roll the whole unit back, otherwise every call is committed separately.
+    """
     @wraps(function)
     async def wrapper(self, *args, **kwargs):
+        if unit := get_unit_of_work():
+            unit.calls_count += 1
+            try:
+                result = await function(self, unit.session, *args, **kwargs)
+                await unit.session.flush()
+                return result
+            except Exception as error:
+                logger.error(error)
+                raise
         session = session_factory()
         try:
             result = await function(self, session, *args, **kwargs)
@@ -51,29 +86,98 @@ def handle_session(function):
     return wrapper
 
 
+def _on_write(item: _Base, result: Optional[_Base]) -> None:
+    context_cache.on_write(item, result)
+
+
+def invalidate_context(function):
+    """Refresh cached update context touched by written item.
+
+    Inside a unit of work cache is refreshed once the unit is committed and
+    dropped if it is rolled back.
+    """
+    @wraps(function)
+    async def wrapper(self, item, *args, **kwargs):
+        result = None
+        try:
+            result = await function(self, item, *args, **kwargs)
+            return result
+        finally:
+            if unit := get_unit_of_work():
+                unit.add_callbacks(on_commit=partial(_on_write, item, result),
+                                   on_rollback=partial(_on_write, item, None))
+            else:
+                _on_write(item, result)
+    return wrapper
+
+
+def _drop_on_rollback(drop: Callable[[], None]) -> None:
+    """Drop context cached inside a unit of work once the unit is rolled back.
+
+    Rollback expires instances loaded by the unit session and closing the
+    session detaches them, so they can not be read by later updates.
+    """
+    if unit := get_unit_of_work():
+        unit.add_callbacks(on_rollback=drop)
+
+
+async def _queue_rate_date(session: AsyncSession, item: _Base) -> None:
+    """Queue date of stored item for rates lookup."""
+    column = RATED_DATE_COLUMNS[type(item)]
+    query = pg_insert(RateDateQueue).from_select(
+        ['date'],
+        select(cast(column, Date)).where(type(item).id == item.id),
+    ).on_conflict_do_nothing()
+    await session.execute(query)
+
+
+def _get_chat_version_scope(chat_id: int) -> str:
+    return f'chat:{chat_id}'
+
+
+async def _bump_data_version(session: AsyncSession, item: _Base) -> None:
+    """Bump version of report data touched by written item in the writing transaction."""
+    if isinstance(item, CHAT_VERSIONED_MODELS):
+        await _bump_version_scope(session, _get_chat_version_scope(item.chat_id))
+    elif isinstance(item, RATES_VERSIONED_MODELS):
+        await _bump_version_scope(session, RATES_VERSION_SCOPE)
+
+
+async def _bump_version_scope(session: AsyncSession, scope: str) -> None:
+    query = pg_insert(DataVersion).values(scope=scope).on_conflict_do_update(
+        index_elements=['scope'], set_={'version': DataVersion.version + 1})
+    await session.execute(query)
+
+
 class _BaseRepo:
     _model: Type[T]
 
+    @invalidate_context
     @handle_session
     async def create_item(self, session: AsyncSession, item: T) -> Optional[T]:
         """Create item."""
         session.add(item)
         await session.flush([item])
+        await _bump_data_version(session, item)
         logger.debug('%s -> %s', item.__class__.__name__, item.as_dict())
         return item
 
+    @invalidate_context
     @handle_session
     async def update_item(self, session: AsyncSession, altered: T) -> Optional[T]:
         """Update item."""
         altered = await session.merge(altered)
+        await _bump_data_version(session, altered)
         logger.debug('%s -> %s', altered.__class__.__name__, altered.as_dict())
         return altered
 
+    @invalidate_context
     @handle_session
     async def delete_item(self, session: AsyncSession, item: T) -> Optional[T]:
         """Delete item."""
         await session.delete(item)
         await session.flush([item])
+        await _bump_data_version(session, item)
         logger.debug('%s item %s deleted', item.__class__.__name__, item.as_dict())
         return item
 
@@ -121,25 +225,60 @@ class TGChatRepository(_BaseRepo):
 
     _model = TGChat
 
-    @handle_session
-    async def get_by_tg_id(self, session: AsyncSession, tg_id: int) -> TGChat | None:
+    async def get_by_tg_id(self, tg_id: int) -> TGChat | None:
         """Get chat by Telegram ID."""
+        if not (chat := context_cache.get_chat(tg_id)):
+            if chat := await self._load_by_tg_id(tg_id):
+                context_cache.set_chat(chat)
+                _drop_on_rollback(partial(context_cache.invalidate_chat, chat.id))
+        return chat
+
+    @handle_session
+    async def _load_by_tg_id(self, session: AsyncSession, tg_id: int) -> TGChat | None:
+        """Load chat aggregate by Telegram ID.
+
+        Every collection is loaded by its own query, so fetched rows grow
+        linearly with chat contents instead of multiplying each other.
+        """
         query = (
             select(TGChat)
-            .outerjoin(ChatBudgetItem, ChatBudgetItem.chat_id == TGChat.id)
-            .outerjoin(Category, Category.id == ChatBudgetItem.category_id)
-            .outerjoin(BudgetItem, BudgetItem.id == ChatBudgetItem.budget_item_id)
             .options(
-                contains_eager(TGChat.categories).contains_eager(Category.budget_items),
-                joinedload(TGChat.valutes),
-                joinedload(TGChat.balances).joinedload(ChatBalance.valute),
-                joinedload(TGChat.fonds).joinedload(ChatFond.valute),
-                joinedload(TGChat.debts).joinedload(ChatDebt.valute),
+                selectinload(TGChat.valutes),
+                selectinload(TGChat.balances).joinedload(ChatBalance.valute),
+                selectinload(TGChat.fonds).joinedload(ChatFond.valute),
+                selectinload(TGChat.debts).joinedload(ChatDebt.valute),
             )
             .where(TGChat.tg_id == tg_id)
         )
         result = await session.execute(query)
-        return result.unique().scalar()
+        if chat := result.scalar():
+            await self._load_categories(session, chat)
+        return chat
+
+    @staticmethod
+    async def _load_categories(session: AsyncSession, chat: TGChat) -> None:
+        """Load chat categories with budget items of this chat only.
+
+        Categories are shared between chats, so Category.budget_items has to
+        be filled from the chat rows of chat_budget_items.
+        """
+        query = (
+            select(Category, BudgetItem)
+            .select_from(ChatBudgetItem)
+            .join(Category, Category.id == ChatBudgetItem.category_id)
+            .outerjoin(BudgetItem, BudgetItem.id == ChatBudgetItem.budget_item_id)
+            .where(ChatBudgetItem.chat_id == chat.id)
+            .order_by(ChatBudgetItem.id)
+        )
+        result = await session.execute(query)
+        categories: dict[Category, list[BudgetItem]] = {}
+        for category, budget_item in result:
+            budget_items = categories.setdefault(category, [])
+            if budget_item is not None and budget_item not in budget_items:
+                budget_items.append(budget_item)
+        for category, budget_items in categories.items():
+            set_committed_value(category, 'budget_items', budget_items)
+        set_committed_value(chat, 'categories', list(categories))
 
 
 class TGUserRepository(_BaseRepo):
@@ -147,20 +286,34 @@ class TGUserRepository(_BaseRepo):
     _model = TGUser
 
     async def get_by_tg_id(self, tg_id: int) -> TGUser | None:
-        return await super()._get_by_tg_id(tg_id)
+        if not (user := context_cache.get_user(tg_id)):
+            if user := await super()._get_by_tg_id(tg_id):
+                context_cache.set_user(user)
+                _drop_on_rollback(partial(context_cache.users.pop, tg_id))
+        return user
 
 
 class UserStateRepository(_BaseRepo):
 
     _model = TGUserState
 
+    async def get_tg_user_state(self, tg_user_id: int) -> Optional[TGUserState]:
+        if not (state := context_cache.get_state(tg_user_id)):
+            if state := await self._load_tg_user_state(tg_user_id):
+                context_cache.set_state(state)
+                _drop_on_rollback(partial(context_cache.states.pop, tg_user_id))
+        return state
+
     @handle_session
-    async def get_tg_user_state(
+    async def _load_tg_user_state(
         self, session: AsyncSession, tg_user_id: int,
     ) -> Optional[TGUserState]:
         query = select(TGUserState).where(TGUserState.tg_user_id == tg_user_id)
         result = await session.execute(query)
-        return result.scalar()
+        if state := result.scalar():
+            # cached state is detached, merging altered state in a unit of work must not write to it
+            session.expunge(state)
+        return state
 
 
 class ChatCategoryBudgetItemRepository(_BaseRepo):
@@ -275,20 +428,107 @@ class ChatValuteRepository(_BaseRepo):
 
 
 class EntryRepository(_BaseRepo):
-    """Entries database interaction methods."""
+    """Entries database interaction methods.
+
+    Entry writes keep entry_month_totals rollup up to date and queue entry
+    date for rates lookup in the same transaction.
+    """
 
     _model = Entry
 
+    @invalidate_context
+    @handle_session
+    async def create_item(self, session: AsyncSession, item: Entry) -> Optional[Entry]:
+        """Create entry."""
+        session.add(item)
+        await session.flush([item])
+        await self._add_to_month_totals(session, item.id)
+        await _queue_rate_date(session, item)
+        await _bump_data_version(session, item)
+        logger.debug('%s -> %s', item.__class__.__name__, item.as_dict())
+        return item
+
+    @invalidate_context
+    @handle_session
+    async def update_item(self, session: AsyncSession, altered: Entry) -> Optional[Entry]:
+        """Update entry."""
+        # stored entry is subtracted, changes of entry attached to session must not be flushed before
+        with session.no_autoflush:
+            await self._add_to_month_totals(session, altered.id, sign=-1)
+        altered = await session.merge(altered)
+        await session.flush([altered])
+        await self._add_to_month_totals(session, altered.id)
+        await _queue_rate_date(session, altered)
+        await _bump_data_version(session, altered)
+        logger.debug('%s -> %s', altered.__class__.__name__, altered.as_dict())
+        return altered
+
+    @invalidate_context
+    @handle_session
+    async def delete_item(self, session: AsyncSession, item: Entry) -> Optional[Entry]:
+        """Delete entry."""
+        await self._add_to_month_totals(session, item.id, sign=-1)
+        await session.delete(item)
+        await session.flush([item])
+        await _bump_data_version(session, item)
+        logger.debug('%s item %s deleted', item.__class__.__name__, item.as_dict())
+        return item
+
+    @staticmethod
+    async def _add_to_month_totals(session: AsyncSession, entry_id: int, sign: int = 1) -> None:
+        """Add stored entry to its month total, negative sign subtracts it."""
+        query = pg_insert(EntryMonthTotal).from_select(
+            ['chat_id', 'month', 'chat_budget_item_id', 'valute_id', 'amount', 'entries_count'],
+            select(
+                Entry.chat_id,
+                cast(func.date_trunc('month', Entry.created_at), Date),
+                Entry.chat_budget_item_id,
+                Entry.valute_id,
+                Entry.amount * sign,
+                literal(sign),
+            ).where(Entry.id == entry_id),
+        )
+        query = query.on_conflict_do_update(
+            index_elements=['chat_id', 'month', 'chat_budget_item_id', 'valute_id'],
+            set_={
+                'amount': EntryMonthTotal.amount + query.excluded.amount,
+                'entries_count': EntryMonthTotal.entries_count + query.excluded.entries_count,
+            },
+        )
+        key = (EntryMonthTotal.chat_id, EntryMonthTotal.month, EntryMonthTotal.chat_budget_item_id,
+               EntryMonthTotal.valute_id)
+        # plain columns, ORM instance of the row already loaded in session would keep its stale counters
+        query = query.returning(*key, EntryMonthTotal.entries_count)
+        if (total := (await session.execute(query)).first()) and total.entries_count <= 0:
+            await session.execute(delete(EntryMonthTotal).where(
+                *(column == value for column, value in zip(key, total)),
+                EntryMonthTotal.entries_count <= 0,
+            ))
+
+    @handle_session
+    async def rebuild_month_totals(self, session: AsyncSession) -> int:
+        """Recalculate entry_month_totals rollup from entries, return rollup rows count."""
+        await session.execute(text('LOCK TABLE entries IN SHARE MODE'))
+        await session.execute(delete(EntryMonthTotal))
+        month = cast(func.date_trunc('month', Entry.created_at), Date)
+        query = pg_insert(EntryMonthTotal).from_select(
+            ['chat_id', 'month', 'chat_budget_item_id', 'valute_id', 'amount', 'entries_count'],
+            select(
+                Entry.chat_id, month, Entry.chat_budget_item_id, Entry.valute_id,
+                func.sum(Entry.amount), func.count(),
+            ).group_by(
+                Entry.chat_id, month, Entry.chat_budget_item_id, Entry.valute_id,
+            ),
+        )
+        result = await session.execute(query)
+        return result.rowcount
+
     @handle_session
     async def get_years(self, session: AsyncSession, chat_id: int) -> List[int]:
         query = select(
-            cast(func.extract('year', Entry.created_at), Integer).label('year'),
-        ).select_from(
-            Entry,
-        ).join(
-            ChatBudgetItem, ChatBudgetItem.id == Entry.chat_budget_item_id,
+            cast(func.extract('year', EntryMonthTotal.month), Integer).label('year'),
         ).where(
-            ChatBudgetItem.chat_id == chat_id,
+            EntryMonthTotal.chat_id == chat_id,
         ).order_by(
             desc('year'),
         ).distinct()
@@ -298,14 +538,10 @@ class EntryRepository(_BaseRepo):
     @handle_session
     async def get_months(self, session: AsyncSession, chat_id: int, year: int) -> List[int]:
         query = select(
-            cast(func.extract('month', Entry.created_at), Integer).label('month'),
-        ).select_from(
-            Entry,
-        ).join(
-            ChatBudgetItem, ChatBudgetItem.id == Entry.chat_budget_item_id,
+            cast(func.extract('month', EntryMonthTotal.month), Integer).label('month'),
         ).where(
-            ChatBudgetItem.chat_id == chat_id,
-            func.extract('year', Entry.created_at) == year,
+            EntryMonthTotal.chat_id == chat_id,
+            func.extract('year', EntryMonthTotal.month) == year,
         ).order_by(
             asc('month'),
         ).distinct()
@@ -320,24 +556,22 @@ class EntryRepository(_BaseRepo):
         period0: datetime.date,
         period1: datetime.date,
     ) -> list[tuple[Category, BudgetItem, Valute, float]]:
-        """Get report data."""
+        """Get report data of months within period."""
         query = select(
-            Category, BudgetItem, Valute, func.sum(Entry.amount).label('amount'),
+            Category, BudgetItem, Valute, func.sum(EntryMonthTotal.amount).label('amount'),
         ).select_from(
-            Entry,
+            EntryMonthTotal,
         ).join(
-            ChatBudgetItem, ChatBudgetItem.id == Entry.chat_budget_item_id,
+            ChatBudgetItem, ChatBudgetItem.id == EntryMonthTotal.chat_budget_item_id,
         ).join(
             Category, Category.id == ChatBudgetItem.category_id,
         ).join(
             BudgetItem, BudgetItem.id == ChatBudgetItem.budget_item_id,
         ).join(
-            TGChat, TGChat.id == ChatBudgetItem.chat_id,
-        ).join(
-            Valute, Valute.id == Entry.valute_id,
+            Valute, Valute.id == EntryMonthTotal.valute_id,
         ).where(
-            ChatBudgetItem.chat_id == chat_id,
-            Entry.created_at.between(period0, period1),
+            EntryMonthTotal.chat_id == chat_id,
+            EntryMonthTotal.month.between(period0.replace(day=1), period1),
         ).group_by(
             Category, BudgetItem, Valute,
         ).order_by(
@@ -348,24 +582,23 @@ class EntryRepository(_BaseRepo):
 
     @handle_session
     async def get_message_entries(
-        self, session: AsyncSession, message_id: int,
+        self, session: AsyncSession, chat_id: int, message_id: int,
     ) -> List[tuple[Category, BudgetItem, Entry, Valute]]:
         query = select(
             Category, BudgetItem, Entry, Valute,
         ).select_from(
             Entry,
         ).join(
-            ChatBudgetItem,
-            and_(
-                ChatBudgetItem.id == Entry.chat_budget_item_id,
-                cast(Entry.data_raw['message_id'], Integer) == message_id,
-            )
+            ChatBudgetItem, ChatBudgetItem.id == Entry.chat_budget_item_id,
         ).join(
             Category, Category.id == ChatBudgetItem.category_id,
         ).join(
             BudgetItem, BudgetItem.id == ChatBudgetItem.budget_item_id,
         ).join(
             Valute, Valute.id == Entry.valute_id,
+        ).where(
+            Entry.chat_id == chat_id,
+            Entry.message_id == message_id,
         )
         result = await session.execute(query)
         return result.all()
@@ -401,27 +634,35 @@ class EntryRepository(_BaseRepo):
         result = await session.execute(q)
         return result.scalars().all()
 
-    async def iterate_chat_entries(
-            self, chat_id: int) -> AsyncIterator[tuple[str, float, str, float]]:
-        """Iterate chat entries."""
-        async with session_factory() as session:
-            q = (
-                select(BudgetItem.type, Entry.amount, Valute.code, ValuteRate.rate)
-                .select_from(TGChat)
-                .join(ChatBudgetItem, ChatBudgetItem.chat_id == TGChat.id)
-                .join(BudgetItem, BudgetItem.id == ChatBudgetItem.budget_item_id)
-                .join(Entry, Entry.chat_budget_item_id == ChatBudgetItem.id)
-                .join(Valute, Valute.id == Entry.valute_id)
-                .outerjoin(
-                    ValuteRate,
-                    and_(ValuteRate.valute_to_id == Valute.id,
-                         ValuteRate.date == func.date(Entry.created_at)))
-                .where(TGChat.id == chat_id)
+    @handle_session
+    async def get_chat_entries_totals(
+        self, session: AsyncSession, chat_id: int,
+    ) -> list[tuple[BudgetItemTypeEnum, str, float, float, int]]:
+        """Get chat entries (type, valute code, amount, amount / rate, count of entries without rate).
+
+        Entries are joined with rates to entry valute on entry date.
+        """
+        q = (
+            select(
+                BudgetItem.type,
+                Valute.code,
+                func.sum(Entry.amount),
+                func.sum(Entry.amount * (1 / ValuteRate.rate)),
+                func.count() - func.count(ValuteRate.rate),
             )
-            async with session.begin():
-                result = await session.stream(q)
-                async for entry in result:
-                    yield entry
+            .select_from(Entry)
+            .join(ChatBudgetItem, ChatBudgetItem.id == Entry.chat_budget_item_id)
+            .join(BudgetItem, BudgetItem.id == ChatBudgetItem.budget_item_id)
+            .join(Valute, Valute.id == Entry.valute_id)
+            .outerjoin(
+                ValuteRate,
+                and_(ValuteRate.valute_to_id == Valute.id,
+                     ValuteRate.date == func.date(Entry.created_at)))
+            .where(Entry.chat_id == chat_id, ChatBudgetItem.chat_id == chat_id)
+            .group_by(BudgetItem.type, Valute.code)
+        )
+        result = await session.execute(q)
+        return result.all()
 
 
 class ValuteRateRepository(_BaseRepo):
@@ -432,17 +673,19 @@ class ValuteRateRepository(_BaseRepo):
     async def get_period_rates(
         self,
         session: AsyncSession,
-        from_codes: list[str],
-        to_codes: list[str],
+        codes: list[str],
         period0: datetime.date,
         period1: datetime.date,
-        last_one: bool = False,
-    ) -> list[ValuteRate]:
+    ) -> list[tuple[str, str, datetime.date, float]]:
+        """Get (from code, to code, date, rate) of period rates between provided valutes."""
         ValuteFrom = aliased(Valute)
         ValuteTo = aliased(Valute)
 
         q = select(
-            ValuteRate,
+            ValuteFrom.code,
+            ValuteTo.code,
+            ValuteRate.date,
+            ValuteRate.rate,
         ).select_from(
             ValuteRate,
         ).join(
@@ -452,46 +695,130 @@ class ValuteRateRepository(_BaseRepo):
         ).where(
             and_(
                 ValuteRate.date.between(period0, period1),
-                ValuteFrom.code.in_(from_codes),
-                ValuteTo.code.in_(to_codes),
+                ValuteFrom.code.in_(codes),
+                ValuteTo.code.in_(codes),
             ),
         )
-        if last_one:
-            q = q.order_by(
-                ValuteRate.date.desc(),
-            ).limit(1)
         result = await session.execute(q)
+        return result.all()
+
+    RATES_INSERT_CHUNK = 1000
+
+    @handle_session
+    async def create_rates(self, session: AsyncSession, rates: list[dict]) -> int:
+        """Insert rates skipping existing ones, return inserted count."""
+        inserted = 0
+        for start in range(0, len(rates), self.RATES_INSERT_CHUNK):
+            query = (
+                pg_insert(ValuteRate)
+                .values(rates[start:start + self.RATES_INSERT_CHUNK])
+                .on_conflict_do_nothing()
+                .returning(ValuteRate.date)
+            )
+            result = await session.execute(query)
+            inserted += len(result.all())
+        if inserted:
+            await _bump_version_scope(session, RATES_VERSION_SCOPE)
+        return inserted
+
+    @handle_session
+    async def get_rate_queue(self, session: AsyncSession) -> list[datetime.date]:
+        """Get dates queued for rates lookup."""
+        result = await session.execute(select(RateDateQueue.date))
         return result.scalars().all()
 
     @handle_session
     async def get_unrated_dates(
-        self, session: AsyncSession, check_column: Column, exclude: list[str] = None,
-    ) -> list[tuple[Valute, datetime.date]]:
-        """Get unrated dates for provided column."""
-        exclude = exclude or []
+        self, session: AsyncSession, queue: list[datetime.date], exclude: list[str] = None,
+    ) -> tuple[list[tuple[Valute, datetime.date]], list[int]]:
+        """Get unrated queued dates and failed lookups due for retry, and ids of history scanned valutes.
 
-        subquery = select(
-            func.cast(check_column, Date).label('check_date'),
-        ).distinct().subquery()
+        Valutes without watermark were never looked up, whole entries,
+        balances and debts history dates are checked for them.
+        """
+        exclude = exclude or []
+        has_watermark = exists().where(ValuteRateWatermark.valute_id == Valute.id)
+        unscanned = (await session.execute(
+            select(Valute.id).where(~has_watermark, Valute.code.notin_(exclude)))).scalars().all()
+
+        candidates = [
+            select(Valute.id.label('valute_id'), RateDateQueue.date)
+            .join(RateDateQueue, true())
+            .where(has_watermark, RateDateQueue.date.in_(queue)),
+            select(ValuteRateFailure.valute_id, ValuteRateFailure.date)
+            .where(ValuteRateFailure.retry_at <= func.now()),
+        ]
+        if unscanned:
+            history = union(*(
+                select(cast(column, Date).label('date')) for column in RATED_DATE_COLUMNS.values()
+            )).subquery()
+            candidates.append(
+                select(Valute.id.label('valute_id'), history.c.date)
+                .join(history, true())
+                .where(Valute.id.in_(unscanned)),
+            )
+        candidates = union(*candidates).subquery()
 
         q = select(
-            Valute, subquery.c.check_date,
+            Valute, candidates.c.date,
         ).join(
-            subquery, true(),
-        ).outerjoin(
-            ValuteRate,
-            and_(
-                ValuteRate.date == subquery.c.check_date,
-                ValuteRate.valute_to_id == Valute.id,
-            )
-        ).where(
-            ValuteRate.date.is_(None),
+            candidates, candidates.c.valute_id == Valute.id,
         ).where(
             Valute.code.notin_(exclude),
+            ~exists().where(
+                ValuteRate.valute_to_id == Valute.id,
+                ValuteRate.date == candidates.c.date,
+            ),
+            ~exists().where(
+                ValuteRateFailure.valute_id == Valute.id,
+                ValuteRateFailure.date == candidates.c.date,
+                ValuteRateFailure.retry_at > func.now(),
+            ),
         )
-
         result = await session.execute(q)
-        return result.all()
+        return result.all(), unscanned
+
+    @handle_session
+    async def finish_rates_lookup(
+        self,
+        session: AsyncSession,
+        queue: list[datetime.date],
+        rated: list[tuple[int, datetime.date]],
+        failed: list[tuple[int, datetime.date]],
+        retry_delay: float,
+        max_retry_delay: float,
+        scanned: list[int] = None,
+    ) -> None:
+        """Record rates lookup result.
+
+        Looked up queue dates are dropped, valutes with scanned history get watermarks,
+        failed lookups are retried after delay doubled by every attempt.
+        """
+        if scanned:
+            await session.execute(
+                pg_insert(ValuteRateWatermark)
+                .values([dict(valute_id=valute_id) for valute_id in scanned])
+                .on_conflict_do_nothing())
+        if queue:
+            await session.execute(delete(RateDateQueue).where(RateDateQueue.date.in_(queue)))
+        if rated:
+            await session.execute(delete(ValuteRateFailure).where(
+                tuple_(ValuteRateFailure.valute_id, ValuteRateFailure.date).in_(rated)))
+        if failed:
+            second = literal_column("interval '1 second'")
+            query = pg_insert(ValuteRateFailure).values([
+                dict(valute_id=valute_id, date=date, retry_at=func.now() + second * retry_delay)
+                for valute_id, date in failed
+            ])
+            query = query.on_conflict_do_update(
+                index_elements=['valute_id', 'date'],
+                set_={
+                    'attempts': ValuteRateFailure.attempts + 1,
+                    'retry_at': func.now() + second * func.least(
+                        retry_delay * func.power(2, ValuteRateFailure.attempts), max_retry_delay),
+                },
+            )
+            await session.execute(query)
 
 
 class ValuteExchangeRepository(_BaseRepo):
@@ -499,21 +826,24 @@ class ValuteExchangeRepository(_BaseRepo):
     _model = ValuteExchange
 
     @handle_session
-    async def get_pair_exchanges(
+    async def get_period_exchanges(
         self,
         session: AsyncSession,
-        from_codes: list[str],
-        to_codes: list[str],
+        codes: list[str],
         period0: datetime.date,
         period1: datetime.date,
-        last_one: bool = False,
-    ) -> list[ValuteExchange]:
-        """Get valute exchanges."""
+    ) -> list[tuple[str, str, datetime.datetime, int, float, float]]:
+        """Get (from code, to code, created at, id, from amount, to amount) of exchanges between provided valutes."""
         ValuteFrom = aliased(Valute)
         ValuteTo = aliased(Valute)
 
         query = select(
-            ValuteExchange,
+            ValuteFrom.code,
+            ValuteTo.code,
+            ValuteExchange.created_at,
+            ValuteExchange.id,
+            ValuteExchange.valute_from_amount,
+            ValuteExchange.valute_to_amount,
         ).select_from(
             ValuteExchange,
         ).join(
@@ -523,19 +853,41 @@ class ValuteExchangeRepository(_BaseRepo):
         ).where(
             and_(
                 ValuteExchange.created_at.between(period0, period1),
-                ValuteFrom.code.in_(from_codes),
-                ValuteTo.code.in_(to_codes),
+                ValuteFrom.code.in_(codes),
+                ValuteTo.code.in_(codes),
             ),
         )
-        if last_one:
-            query = query.order_by(
-                ValuteExchange.created_at.desc(),
-            ).limit(1)
         result = await session.execute(query)
-        return result.scalars().all()
+        return result.all()
+
+
+class _RateDatesRepo(_BaseRepo):
+    """Repository of items whose dates are queued for rates lookup on write."""
+
+    @invalidate_context
+    @handle_session
+    async def create_item(self, session: AsyncSession, item: T) -> Optional[T]:
+        """Create item."""
+        session.add(item)
+        await session.flush([item])
+        await _queue_rate_date(session, item)
+        await _bump_data_version(session, item)
+        logger.debug('%s -> %s', item.__class__.__name__, item.as_dict())
+        return item
+
+    @invalidate_context
+    @handle_session
+    async def update_item(self, session: AsyncSession, altered: T) -> Optional[T]:
+        """Update item."""
+        altered = await session.merge(altered)
+        await session.flush([altered])
+        await _queue_rate_date(session, altered)
+        await _bump_data_version(session, altered)
+        logger.debug('%s -> %s', altered.__class__.__name__, altered.as_dict())
+        return altered
 
 
-class ChatBalanceRepository(_BaseRepo):
+class ChatBalanceRepository(_RateDatesRepo):
     """Telegram chat balance repository."""
 
     _model = ChatBalance
@@ -547,12 +899,45 @@ class ChatFondRepository(_BaseRepo):
     _model = ChatFond
 
 
-class ChatDebtRepository(_BaseRepo):
+class ChatDebtRepository(_RateDatesRepo):
     """Telegram chat debt repository."""
 
     _model = ChatDebt
 
 
+class SchedulerJobRunRepository(_BaseRepo):
+    """Scheduler jobs runs shared by bot instances."""
+
+    _model = SchedulerJobRun
+
+    @handle_session
+    async def claim_run(self, session: AsyncSession, job_id: str, min_interval: float) -> bool:
+        """Record job run now unless it was run less than min_interval seconds ago."""
+        query = pg_insert(SchedulerJobRun).values(job_id=job_id)
+        query = query.on_conflict_do_update(
+            index_elements=['job_id'],
+            set_={'last_run_at': func.now()},
+            where=SchedulerJobRun.last_run_at <= func.now() - literal_column("interval '1 second'") * min_interval,
+        ).returning(SchedulerJobRun.job_id)
+        result = await session.execute(query)
+        return result.first() is not None
+
+
+class DataVersionRepository(_BaseRepo):
+    """Report source data versions shared by bot instances."""
+
+    _model = DataVersion
+
+    @handle_session
+    async def get_version(self, session: AsyncSession, chat_id: int) -> tuple[int, int]:
+        """Get chat data and rates versions."""
+        chat_scope = _get_chat_version_scope(chat_id)
+        query = select(DataVersion.scope, DataVersion.version).where(
+            DataVersion.scope.in_([chat_scope, RATES_VERSION_SCOPE]))
+        versions = dict((await session.execute(query)).all())
+        return versions.get(chat_scope, 0), versions.get(RATES_VERSION_SCOPE, 0)
+
+
 class DatabaseAccessor:
     """Database accessor."""
 
@@ -570,6 +955,8 @@ class DatabaseAccessor:
     chat_balance_repo: ChatBalanceRepository
     chat_fond_repo: ChatFondRepository
     chat_debt_repo: ChatDebtRepository
+    job_run_repo: SchedulerJobRunRepository
+    data_version_repo: DataVersionRepository
 
     def __init__(self) -> None:
         self.chat_repo = TGChatRepository()
@@ -586,3 +973,5 @@ class DatabaseAccessor:
         self.chat_balance_repo = ChatBalanceRepository()
         self.chat_fond_repo = ChatFondRepository()
         self.chat_debt_repo = ChatDebtRepository()
+        self.job_run_repo = SchedulerJobRunRepository()
+        self.data_version_repo = DataVersionRepository()
@@ -1,7 +1,113 @@
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from logging import getLogger
+from typing import AsyncIterator, Callable, Optional
+
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 from app.core.config import DATABASE_URL
 
 
+logger = getLogger('db')
+
 async_engine = create_async_engine(DATABASE_URL, echo=False, future=True)
 session_factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+class UnitOfWork:
+    """Session and transaction shared by all repository calls of one unit of work."""
+
+    session: AsyncSession
+    calls_count: int
+
+    def __init__(self) -> None:
+        self.session = session_factory()
+        self.calls_count = 0
+        self._on_commit: list[Callable[[], None]] = []
+        self._on_rollback: list[Callable[[], None]] = []
+
+    def add_callbacks(
+        self,
+        on_commit: Optional[Callable[[], None]] = None,
+        on_rollback: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """Register callbacks run after transaction is committed or session is rolled back.
+
+        Rollback callbacks are kept when a transaction is committed, as rollback
+        of any later transaction expires every instance loaded by the session.
+        """
+        if on_commit:
+            self._on_commit.append(on_commit)
+        if on_rollback:
+            self._on_rollback.append(on_rollback)
+
+    async def commit(self) -> None:
+        await self.session.commit()
+        self._run(self._on_commit)
+
+    async def rollback(self) -> None:
+        await self.session.rollback()
+        self._run(self._on_rollback)
+
+    @staticmethod
+    def _run(callbacks: list[Callable[[], None]]) -> None:
+        for callback in callbacks:
+            callback()
+        callbacks.clear()
+
+
+_current_unit: ContextVar[Optional[UnitOfWork]] = ContextVar('current_unit', default=None)
+
+
+def get_unit_of_work() -> Optional[UnitOfWork]:
+    """Get unit of work of the current context."""
+    return _current_unit.get()
+
+
+async def commit_unit_of_work() -> None:
+    """Commit writes made so far by the unit of work of the current context, if any.
+
+    The unit goes on in a new transaction of the same session.
+    """
+    if unit := _current_unit.get():
+        await unit.commit()
+        logger.debug('unit of work committed %s calls', unit.calls_count)
+
+
+@asynccontextmanager
+async def unit_of_work() -> AsyncIterator[UnitOfWork]:
+    """Bind one session to the context, commit once on exit or roll back on error.
+
+    Nested units join the outer one.
+    """
+    if unit := _current_unit.get():
+        yield unit
+        return
+    unit = UnitOfWork()
+    token = _current_unit.set(unit)
+    try:
+        yield unit
+        await unit.commit()
+        logger.debug('unit of work committed %s calls', unit.calls_count)
+    except BaseException:
+        await unit.rollback()
+        raise
+    finally:
+        _current_unit.reset(token)
+        await unit.session.close()
+
+
+@asynccontextmanager
+async def advisory_lock(key: int) -> AsyncIterator[bool]:
+    """Hold Postgres advisory lock unless other session holds it, yield whether it is held.
+
+    The lock is held by a separate connection, so it spans any transactions made meanwhile.
+    """
+    async with async_engine.connect() as connection:
+        acquired = (await connection.execute(text('SELECT pg_try_advisory_lock(:key)'), {'key': key})).scalar()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                await connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': key})
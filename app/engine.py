@@ -1,12 +1,19 @@
 from logging import getLogger
+from typing import Optional
 
 from app.accountant.enums import CallbackHandlerEnum, CommandHadlerEnum, CommonCallbackHandlerEnum, MessageHandlerEnum
 from app.accountant.registry import registry_mapper
 from app.accountant.base import Accountant
+from app.accountant.render_pool import render_pool
+from app.accountant.report import report_cache, report_flights
 from app.core import config
+from app.db_service.cache import context_cache
 from app.db_service.repository import DatabaseAccessor
 from app.scheduler import scheduler
+from app.tg_service import api as tg_api
 from app.tg_service.editor import TGMessageEditor
+from app.tg_service.schemas import SetWebhookRequestSchema
+from app.tg_service.webhook import WebhookServer
 
 from .core.logger import setup_logger
 from .tg_service import TelegramClient
@@ -23,9 +30,20 @@ class Engine:
     tg_client: TelegramClient
     editor: TGMessageEditor
     accountant: Accountant
+    webhook: Optional[WebhookServer] = None
 
     def __init__(self):
-        self.tg_client = TelegramClient(config.TG_BASE_URL)
+        is_polling = config.TG_UPDATES_MODE == 'polling'
+        self.tg_client = TelegramClient(
+            config.TG_BASE_URL,
+            managers_count=config.TG_MANAGERS_COUNT,
+            senders_count=config.TG_SENDERS_COUNT,
+            is_polling=is_polling,
+        )
+        if not is_polling:
+            self.webhook = WebhookServer(
+                self.tg_client, host=config.TG_WEBHOOK_HOST, port=config.TG_WEBHOOK_PORT,
+                path=config.TG_WEBHOOK_PATH, secret_token=config.TG_WEBHOOK_SECRET)
         self.db = DatabaseAccessor()
         self.editor = TGMessageEditor()
         self.accountant = Accountant(
@@ -34,6 +52,7 @@ class Engine:
             callback_handlers=registry_mapper.get(CallbackHandlerEnum),
             message_handlers=registry_mapper.get(MessageHandlerEnum),
             common_callback_handlers=registry_mapper.get(CommonCallbackHandlerEnum),
+            use_unit_of_work=config.DB_UNIT_OF_WORK,
         )
         self.tg_client.accountant = self.accountant
         self.accountant.tg_client = self.tg_client
@@ -42,11 +61,28 @@ class Engine:
         """Start app."""
         logger.info('Start app')
         scheduler.start()
+        await render_pool.start()
         await self.tg_client.start()
+        if self.webhook:
+            await self.webhook.start()
+            request = SetWebhookRequestSchema(
+                url=config.TG_WEBHOOK_URL, secret_token=config.TG_WEBHOOK_SECRET,
+                allowed_updates=config.TG_ALLOWED_UPDATES)
+            response = await self.tg_client.call(tg_api.SetWebhook, request)
+            if not response or not response.ok:
+                logger.error('set webhook-E %s', response)
+                raise RuntimeError(f'webhook is not set: {response}')
 
     async def stop_app(self):
         """Stop app."""
         logger.info('Stop app')
         logger.info('Stop app')
         scheduler.shutdown(wait=True)
+        if self.webhook:
+            await self.webhook.stop()
         await self.tg_client.stop()
+        await render_pool.stop()
+        logger.info('context cache metrics %s', context_cache.get_metrics())
+        logger.info('report cache metrics %s, shared calculations %s',
+                    report_cache.stats.as_dict(), report_flights.shared_count)
+        logger.info('render pool metrics %s', render_pool.get_metrics())
@@ -1,14 +1,21 @@
 from abc import ABC, abstractmethod
+import asyncio
 import datetime
 from logging import getLogger
-from typing import Literal, Optional, Union
+from typing import Literal, Optional, Type, Union
 
-from httpx import AsyncClient, ConnectError, ConnectTimeout, Timeout
+from httpx import AsyncClient, ConnectError, ConnectTimeout, Limits, Timeout
 import xml.etree.ElementTree as ET
 
+from app.core.config import RATES_PROVIDER_CONCURRENCY, RATES_REQUEST_TIMEOUT
+
 
 logger = getLogger('rates')
 
+# range lookback is doubled up to this until rate published before interval is found,
+# e.g. CBR publishes nothing over New Year holidays
+RANGE_MAX_LOOKBACK_DAYS = 64
+
 KNOWN_ERRORS = (
     ValueError,
     ConnectError,
@@ -19,23 +26,24 @@ KNOWN_ERRORS = (
 class _BaseSeeker(ABC):
     base_url: str
     is_json_response: bool = True
+    # days before interval requested to fill its beginning, zero if range request ignores interval
+    range_lookback_days: int = 0
 
     @staticmethod
     async def _request(
+        client: AsyncClient,
         url: str,
         method: Literal['GET'] = 'GET',
         headers: Optional[dict] = None,
         json: Optional[dict] = None,
         is_json_response: bool = True,
     ) -> tuple[int, Union[dict, str]]:
-        timeout = Timeout(timeout=15)
-        async with AsyncClient(timeout=timeout) as client:
-            logger.debug('request %s %s %s %s', method, url, headers, json)
-            response = await client.request(method=method, url=url, json=json, headers=headers)
-            status = response.status_code
-            content = response.json() if is_json_response else response.text
-            logger.debug('response %s %s', status, content)
-            return status, content
+        logger.debug('request %s %s %s %s', method, url, headers, json)
+        response = await client.request(method=method, url=url, json=json, headers=headers)
+        status = response.status_code
+        content = response.json() if is_json_response else response.text
+        logger.debug('response %s %s', status, content)
+        return status, content
 
     @abstractmethod
     def extract_rate(self, content: dict) -> float:
@@ -45,9 +53,37 @@ class _BaseSeeker(ABC):
     def make_url(self, date: datetime.date) -> str:
         pass
 
+    @abstractmethod
+    def make_range_url(self, date0: datetime.date, date1: datetime.date) -> str:
+        pass
+
+    @abstractmethod
+    def extract_range_rates(self, content: Union[list, str]) -> dict[datetime.date, float]:
+        """Rates by dates provider published them for."""
+        pass
+
+    @staticmethod
+    def fill_days(
+        rates: dict[datetime.date, float], date0: datetime.date, date1: datetime.date,
+    ) -> dict[datetime.date, float]:
+        """Rate for every interval day, last published one as day request returns."""
+        filled = {}
+        published = sorted(rates.items())
+        index, rate = 0, None
+        day = date0
+        while day <= date1:
+            while index < len(published) and published[index][0] <= day:
+                rate = published[index][1]
+                index += 1
+            if rate:
+                filled[day] = rate
+            day += datetime.timedelta(days=1)
+        return filled
+
 
 class ARSSeeker(_BaseSeeker):
     base_url = 'https://api.bluelytics.com.ar/v2/historical?day={date}'
+    range_url = 'https://api.bluelytics.com.ar/v2/evolution.json'
 
     def make_url(self, date: datetime.date) -> str:
         return self.base_url.format(date=date.isoformat())
@@ -56,10 +92,25 @@ class ARSSeeker(_BaseSeeker):
         usd_to_ars = content.get('blue', {}).get('value_buy')
         return usd_to_ars
 
+    def make_range_url(self, date0: datetime.date, date1: datetime.date) -> str:
+        # evolution has no interval parameters, the whole history is returned
+        return self.range_url
+
+    def extract_range_rates(self, content: list) -> dict[datetime.date, float]:
+        return {
+            datetime.date.fromisoformat(item['date']): item['value_buy']
+            for item in content
+            if item.get('source') == 'Blue' and item.get('value_buy')
+        }
+
 
 class RUBSeeker(_BaseSeeker):
     base_url = 'https://www.cbr.ru/scripts/XML_daily.asp?date_req={date}'
+    range_url = 'https://www.cbr.ru/scripts/XML_dynamic.asp?date_req1={date0}&date_req2={date1}&VAL_NM_RQ={usd_id}'
+    usd_id = 'R01235'
     is_json_response = False
+    # rates are set on working days only
+    range_lookback_days = 10
 
     def make_url(self, date: datetime.date) -> str:
         return self.base_url.format(date=date.strftime('%d.%m.%Y'))
@@ -72,24 +123,89 @@ class RUBSeeker(_BaseSeeker):
             if char_code == 'USD':
                 return round(float(valute.find('Value').text.replace(',', '.')), 6)
 
+    def make_range_url(self, date0: datetime.date, date1: datetime.date) -> str:
+        return self.range_url.format(
+            date0=date0.strftime('%d/%m/%Y'), date1=date1.strftime('%d/%m/%Y'), usd_id=self.usd_id)
+
+    def extract_range_rates(self, content: str) -> dict[datetime.date, float]:
+        xml = ET.fromstring(content)
+        return {
+            datetime.datetime.strptime(record.get('Date'), '%d.%m.%Y').date():
+                round(float(record.find('Value').text.replace(',', '.')), 6)
+            for record in xml.findall('Record')
+        }
+
 
 class RateSeeker:
-    mapper = {
+    """Rates of valutes to USD from their providers.
+
+    Requests share one pooled HTTP client opened by `async with`, every
+    provider gets at most `concurrency` requests at once.
+    """
+
+    mapper: dict[str, Type[_BaseSeeker]] = {
         'ARS': ARSSeeker,
         'RUB': RUBSeeker,
     }
 
-    async def get_rate(self, valute_code: str, date: datetime.date) -> Optional[float]:
-        seeker: _BaseSeeker = self.mapper.get(valute_code)
-        if not seeker:
-            raise ValueError(f'no seeker implemented for valute {valute_code}')
+    http: Optional[AsyncClient] = None
+
+    def __init__(self, concurrency: int = RATES_PROVIDER_CONCURRENCY) -> None:
+        self.concurrency = concurrency
+        self._seekers: dict[Type[_BaseSeeker], _BaseSeeker] = {}
+        self._semaphores: dict[Type[_BaseSeeker], asyncio.Semaphore] = {}
+
+    async def __aenter__(self) -> 'RateSeeker':
+        self.http = AsyncClient(
+            timeout=Timeout(timeout=RATES_REQUEST_TIMEOUT),
+            limits=Limits(max_connections=self.concurrency * len(self.mapper)),
+        )
+        return self
 
-        seeker = seeker()
+    async def __aexit__(self, *args) -> None:
+        await self.http.aclose()
+        self.http = None
 
-        url = seeker.make_url(date)
-        status, content = await seeker._request(url=url, is_json_response=seeker.is_json_response)
+    def is_supported(self, valute_code: str) -> bool:
+        return valute_code in self.mapper
+
+    def _get_seeker(self, valute_code: str) -> _BaseSeeker:
+        seeker_class = self.mapper.get(valute_code)
+        if not seeker_class:
+            raise ValueError(f'no seeker implemented for valute {valute_code}')
+        if not (seeker := self._seekers.get(seeker_class)):
+            seeker = self._seekers[seeker_class] = seeker_class()
+            self._semaphores[seeker_class] = asyncio.Semaphore(self.concurrency)
+        return seeker
+
+    async def _fetch(self, valute_code: str, seeker: _BaseSeeker, url: str) -> Union[dict, list, str]:
+        async with self._semaphores[type(seeker)]:
+            status, content = await seeker._request(
+                self.http, url=url, is_json_response=seeker.is_json_response)
 
         if status != 200:
             raise ValueError(f'response status {status} for valute {valute_code}')
 
+        return content
+
+    async def get_rate(self, valute_code: str, date: datetime.date) -> Optional[float]:
+        seeker = self._get_seeker(valute_code)
+        content = await self._fetch(valute_code, seeker, seeker.make_url(date))
         return seeker.extract_rate(content)
+
+    async def get_range_rates(
+        self, valute_code: str, date0: datetime.date, date1: datetime.date,
+    ) -> dict[datetime.date, float]:
+        """Rates for every interval day in one provider request.
+
+        Range is widened to the past until it has a rate to fill the first interval day with.
+        """
+        seeker = self._get_seeker(valute_code)
+        lookback = seeker.range_lookback_days
+        while True:
+            url = seeker.make_range_url(date0 - datetime.timedelta(days=lookback), date1)
+            rates = seeker.extract_range_rates(await self._fetch(valute_code, seeker, url))
+            if not lookback or lookback >= RANGE_MAX_LOOKBACK_DAYS or any(day <= date0 for day in rates):
+                break
+            lookback = min(lookback * 2, RANGE_MAX_LOOKBACK_DAYS)
+        return seeker.fill_days(rates, date0, date1)
@@ -1,16 +1,29 @@
+from functools import wraps
 from logging import getLogger
+from typing import Awaitable, Callable
+import zlib
 
-from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.jobstores.memory import MemoryJobStore
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from pytz import utc
 
-from app.core.config import APSCHEDULER_DB_URL, ONE_MINUTE
+from app.core.config import APSCHEDULER_DB_URL, ONE_MINUTE, SCHEDULER_JOB_STORE
+from app.db_service import DatabaseAccessor
+from app.db_service.session import advisory_lock
 
 
 logger = getLogger('apscheduler')
 
+db = DatabaseAccessor()
+
+if SCHEDULER_JOB_STORE == 'sqlalchemy':
+    from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+    jobstore = SQLAlchemyJobStore(url=APSCHEDULER_DB_URL)
+else:
+    jobstore = MemoryJobStore()
+
 jobstores = {
-    'default': SQLAlchemyJobStore(url=APSCHEDULER_DB_URL),
+    'default': jobstore,
 }
 job_defaults = {
     'misfire_grace_time': ONE_MINUTE * 10,
@@ -20,3 +33,26 @@ scheduler = AsyncIOScheduler(
     jobstores=jobstores,
     job_defaults=job_defaults,
 )
+
+
+def exclusive_job(job_id: str, interval: float):
+    """Run job in one bot instance only.
+
+    Job runs under Postgres advisory lock and is skipped if other instance
+    holds the lock or has run it less than half of interval seconds ago.
+    """
+    lock_key = zlib.crc32(job_id.encode())
+
+    def decorator(function: Callable[[], Awaitable[None]]):
+        @wraps(function)
+        async def wrapper() -> None:
+            async with advisory_lock(lock_key) as acquired:
+                if not acquired:
+                    logger.info('%s-I skipped, running in other instance', job_id)
+                    return
+                if not await db.job_run_repo.claim_run(job_id, interval / 2):
+                    logger.info('%s-I skipped, run recently', job_id)
+                    return
+                await function()
+        return wrapper
+    return decorator
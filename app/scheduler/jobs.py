@@ -1,34 +1,101 @@
-from typing import TYPE_CHECKING
+import asyncio
+import time
+from typing import TYPE_CHECKING, Optional
 
 from app.constants import USD_CODE, USDT_CODE
-from app.db_service.models import ChatBalance, ChatDebt, Entry, ValuteRate
+from app.core.config import RATES_RETRY_DELAY, RATES_RETRY_MAX_DELAY
+from app.db_service.models import Valute
 
 from .common import logger
 
 
 if TYPE_CHECKING:
+    import datetime
+
     from app.db_service import DatabaseAccessor
     from app.rates_service import RateSeeker
 
 
+EXCLUDED_VALUTES = [USD_CODE, USDT_CODE]
+
+
+async def _get_unrated(
+    db: 'DatabaseAccessor', seeker: 'RateSeeker', queue: list['datetime.date'],
+) -> Optional[tuple[dict[str, tuple[Valute, list['datetime.date']]], list[tuple[int, 'datetime.date']], list[int]]]:
+    """Unrated dates of supported valutes by valute code, unsupported valutes dates and history scanned valutes."""
+    if (found := await db.valute_rate_repo.get_unrated_dates(queue, exclude=EXCLUDED_VALUTES)) is None:
+        return None
+    unrated, scanned = found
+    unsupported = {valute.code for valute, _ in unrated if not seeker.is_supported(valute.code)}
+    if unsupported:
+        logger.warning('get_rates-W no seeker for valutes %s', ', '.join(sorted(unsupported)))
+
+    by_valute: dict[str, tuple[Valute, list['datetime.date']]] = {}
+    for valute, date in unrated:
+        if valute.code not in unsupported:
+            by_valute.setdefault(valute.code, (valute, []))[1].append(date)
+    unsupported_dates = [(valute.id, date) for valute, date in unrated if valute.code in unsupported]
+    return by_valute, unsupported_dates, scanned
+
+
+async def _fetch_day_rate(seeker: 'RateSeeker', valute: Valute, date: 'datetime.date') -> Optional[float]:
+    try:
+        return await seeker.get_rate(valute.code, date)
+    except Exception as error:
+        logger.exception('get_rates-E code %s date %s error %s', valute.code, date.isoformat(), error)
+
+
+async def _fetch_rates(
+    seeker: 'RateSeeker', valute: Valute, dates: list['datetime.date'],
+) -> dict['datetime.date', float]:
+    """Valute rates for dates in one range request, day requests for dates it did not cover."""
+    try:
+        rates = await seeker.get_range_rates(valute.code, min(dates), max(dates))
+    except Exception as error:
+        logger.exception('get_rates-E code %s range error %s, fetching by days', valute.code, error)
+        rates = {}
+    if uncovered := [date for date in dates if not rates.get(date)]:
+        day_rates = await asyncio.gather(*(_fetch_day_rate(seeker, valute, date) for date in uncovered))
+        rates.update(zip(uncovered, day_rates))
+    rates = {date: rate for date in dates if (rate := rates.get(date))}
+    if missing := sorted(set(dates) - set(rates)):
+        logger.warning('get_rates-W code %s no rates for %s', valute.code, ', '.join(map(str, missing)))
+    return rates
+
+
 async def get_rates(db: 'DatabaseAccessor', seeker: 'RateSeeker') -> None:
-    """Get valutes rates to USD for entries dates."""
+    """Get valutes rates to USD for newly written and failed before dates.
+
+    Dates of failed lookups are retried with exponential backoff.
+    """
+    started_at = time.monotonic()
     usd = await db.valute_repo.get_by_code(USD_CODE)
+    queue = await db.valute_rate_repo.get_rate_queue()
+    if queue is None or (found := await _get_unrated(db, seeker, queue)) is None:
+        return
+    unrated, failed, scanned = found
+
+    async with seeker:
+        fetched = await asyncio.gather(*(_fetch_rates(seeker, *item) for item in unrated.values()))
+    rates = []
+    for (valute, dates), valute_rates in zip(unrated.values(), fetched):
+        rates += [
+            dict(valute_from_id=usd.id, valute_to_id=valute.id, rate=rate, date=date)
+            for date, rate in valute_rates.items()
+        ]
+        failed += [(valute.id, date) for date in dates if date not in valute_rates]
+    inserted = await db.valute_rate_repo.create_rates(rates) if rates else 0
+    if inserted is not None:
+        await db.valute_rate_repo.finish_rates_lookup(
+            queue,
+            rated=[(rate['valute_to_id'], rate['date']) for rate in rates],
+            failed=failed,
+            retry_delay=RATES_RETRY_DELAY,
+            max_retry_delay=RATES_RETRY_MAX_DELAY,
+            scanned=scanned,
+        )
 
-    for column in (Entry.created_at, ChatBalance.updated_at, ChatDebt.updated_at):
-        for valute, date in await db.valute_rate_repo.get_unrated_dates(
-                check_column=column, exclude=[USD_CODE, USDT_CODE]):
-            try:
-                rate = await seeker.get_rate(valute.code, date)
-                if rate:
-                    await db.valute_rate_repo.create_item(
-                        ValuteRate(
-                            valute_from_id=usd.id,
-                            valute_to_id=valute.id,
-                            rate=rate,
-                            date=date,
-                        )
-                    )
-            except Exception as error:
-                logger.exception('get_rates-E code %s date %s error %s',
-                                 valute.code, date.isoformat(), error)
+    elapsed = time.monotonic() - started_at
+    logger.info('get_rates queued %s, unrated %s, fetched %s, inserted %s, failed %s in %.2fs, %.1f rates/s',
+                len(queue), sum(len(dates) for _, dates in unrated.values()), len(rates), inserted,
+                len(failed), elapsed, len(rates) / elapsed if elapsed else 0)
@@ -1,19 +1,20 @@
 from apscheduler.triggers.interval import IntervalTrigger
 
-from app.db_service import DatabaseAccessor
+from app.core.config import ONE_MINUTE
 from app.rates_service import RateSeeker
 
 from . import jobs
-from .common import logger, scheduler
+from .common import db, exclusive_job, logger, scheduler
 
 
-db = DatabaseAccessor()
+GET_RATES_INTERVAL = ONE_MINUTE * 3
 
 
 @scheduler.scheduled_job(
-    trigger=IntervalTrigger(minutes=3),
+    trigger=IntervalTrigger(seconds=GET_RATES_INTERVAL),
     id='get_reates_periodic_job',
 )
+@exclusive_job('get_rates_periodic_job', GET_RATES_INTERVAL)
 async def get_rates_periodic_job() -> None:
     """Run getting rates daily job."""
     try:
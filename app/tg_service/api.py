@@ -1,12 +1,21 @@
+from typing import Optional
+
 from pydantic import BaseModel
 
 from app.tg_service import schemas as api_schemas
+from app.tg_service.enums import SendLaneEnum
 
 
 class TGAPI:
     name: str
     request_schema: type[BaseModel]
     response_schema: type[BaseModel]
+    lane: SendLaneEnum = SendLaneEnum.INTERACTIVE
+    # pending request to the same message is replaced by a newer one, only the last matters
+    is_coalesced: bool = False
+    # pending requests to one chat are merged into one by extending this list field
+    batch_field: Optional[str] = None
+    batch_size: int = 1
 
 
 class SendMessage(TGAPI):
@@ -19,12 +28,23 @@ class DeleteMessage(TGAPI):
     name = 'deleteMessage'
     request_schema = api_schemas.DeleteMessageRequestSchema
     response_schema = None
+    lane = SendLaneEnum.CLEANUP
+
+
+class DeleteMessages(TGAPI):
+    name = 'deleteMessages'
+    request_schema = api_schemas.DeleteMessagesRequestSchema
+    response_schema = None
+    lane = SendLaneEnum.CLEANUP
+    batch_field = 'message_ids'
+    batch_size = 100
 
 
 class EditMessageText(TGAPI):
     name = 'editMessageText'
     request_schema = api_schemas.EditMessageTextRequestSchema
     response_schema = api_schemas.EditMessageTextResponseSchema
+    is_coalesced = True
 
 
 class EditMessageReplyMarkup(TGAPI):
@@ -37,3 +57,16 @@ class SendPhoto(TGAPI):
     name = 'sendPhoto'
     request_schema = api_schemas.SendPhotoRequestSchema
     response_schema = api_schemas.SendPhotoResponseSchema
+    lane = SendLaneEnum.MEDIA
+
+
+class SetWebhook(TGAPI):
+    name = 'setWebhook'
+    request_schema = api_schemas.SetWebhookRequestSchema
+    response_schema = api_schemas.BoolResponseSchema
+
+
+class DeleteWebhook(TGAPI):
+    name = 'deleteWebhook'
+    request_schema = api_schemas.DeleteWebhookRequestSchema
+    response_schema = api_schemas.BoolResponseSchema
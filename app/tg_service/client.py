@@ -1,16 +1,30 @@
 import asyncio
+import hashlib
+import json as json_lib
 from json import JSONDecodeError
 from logging import getLogger
 from typing import TYPE_CHECKING, Literal, Optional, Type, Union
 
-from httpx import AsyncClient, RequestError, Response
+from httpx import AsyncClient, Limits, RequestError, Response, Timeout
 from pydantic import ValidationError
 
+from app.tg_service import api as tg_api
 from app.tg_service.api import TGAPI
 from app.utils import custom_urljoin
 
+from ..core import config
+from ..core.cache import LRUCache
 from ..core.config import POLLER_REQUEST_TIMEOUT
-from .schemas import RequestSchema, ResponseSchema, TGUpdateSchema
+from .schemas import (
+    DeleteWebhookRequestSchema,
+    GetUpdatesResponseSchema,
+    RequestSchema,
+    ResponseSchema,
+    TGCallbackQuerySchema,
+    TGMessageSchema,
+    TGUpdateSchema,
+)
+from .throttling import SendScheduler
 
 
 if TYPE_CHECKING:
@@ -19,135 +33,395 @@ if TYPE_CHECKING:
 logger = getLogger('tg_client')
 
 
+class SendTaskError(Exception):
+    """Send task failed."""
+
+
+class SendTaskTimeoutError(SendTaskError):
+    """Send task was not done before its deadline."""
+
+
 class SendTaskSchema:
+    """Queued Telegram API request and future of its response.
+
+    The future resolves with validated response, None for invalid one, error
+    raised by sending or timeout error once method deadline passes. Task is
+    awaitable, so several sends can be gathered.
+    """
+
     method: Type[TGAPI]
     data: RequestSchema
-    event: asyncio.Event
-    response: Union[dict, ResponseSchema, None]
+    future: asyncio.Future
+    deadline: float
 
     def __init__(
         self, method: Type[TGAPI], data: RequestSchema,
     ) -> None:
-        self.response = None
         self.method = method
         self.data = data
-        self.event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        self.future = loop.create_future()
+        self.deadline = loop.time() + config.TG_SEND_DEADLINES.get(method.name, config.TG_SEND_DEFAULT_DEADLINE)
+        self._expire_handle = loop.call_at(self.deadline, self._expire)
+        # retrieved here, so error of a task nobody waits for is not reported as lost
+        self.future.add_done_callback(lambda future: future.exception())
+
+    def __await__(self):
+        return self.wait().__await__()
+
+    @property
+    def is_done(self) -> bool:
+        return self.future.done()
+
+    def set_response(self, response: Optional[ResponseSchema]) -> None:
+        if not self.future.done():
+            self.future.set_result(response)
+            self._expire_handle.cancel()
+
+    def set_error(self, error: Exception) -> None:
+        if not self.future.done():
+            self.future.set_exception(error)
+            self._expire_handle.cancel()
+
+    async def wait(self) -> Optional[ResponseSchema]:
+        """Wait for response, None if sending failed or timed out."""
+        try:
+            return await asyncio.shield(self.future)
+        except SendTaskError as error:
+            logger.error('send_task-E %s %s', self.method.name, error)
+
+    def resolve_with(self, task: 'SendTaskSchema') -> None:
+        """Resolve with the result of task which superseded this one."""
+        task.future.add_done_callback(self._copy_result)
+
+    def _copy_result(self, future: asyncio.Future) -> None:
+        if future.exception():
+            self.set_error(future.exception())
+        else:
+            self.set_response(future.result())
+
+    def _expire(self) -> None:
+        self.set_error(SendTaskTimeoutError(f'{self.method.name} deadline passed'))
+
+
+class PoolStats:
+    """HTTP connection pool reuse counters."""
+
+    hits: int
+    misses: int
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> dict:
+        return {'pool_hits': self.hits, 'pool_misses': self.misses,
+                'pool_hit_ratio': round(self.hit_ratio, 4)}
+
+
+class _RequestTrace:
+    """httpcore trace hook detecting whether request opened a new connection."""
+
+    is_new_connection: bool = False
+
+    async def __call__(self, event_name: str, info: dict) -> None:
+        if event_name == 'connection.connect_tcp.started':
+            self.is_new_connection = True
 
 
 class TelegramClient:
     base_url: str
+    http: Optional[AsyncClient] = None
+    pool_stats: PoolStats
     manage_tasks: list[asyncio.Task]
     send_tasks: list[asyncio.Task]
     managers_count: int = 1
     senders_count: int = 1
+    is_polling: bool = True
     is_running: bool = False
     listen_task: asyncio.Task = None
-    manage_queue: asyncio.Queue = None
-    send_queue: asyncio.Queue = None
+    manage_queues: list[asyncio.Queue] = None
+    send_scheduler: SendScheduler = None
+    photo_file_ids: LRUCache
+    sent_edits: LRUCache
     offset: int = 0
     _sleep_for: int = 5
 
     accountant: 'Accountant' = None
 
-    def __init__(self, base_url: str, managers_count: int = 1, senders_count: int = 1):
+    def __init__(self, base_url: str, managers_count: int = 1, senders_count: int = 1,
+                 is_polling: bool = True):
         self.base_url = base_url
+        self.is_polling = is_polling
         self.manage_tasks = []
         self.send_tasks = []
         self.managers_count = managers_count
         self.senders_count = senders_count
+        self.pool_stats = PoolStats()
+        self.photo_file_ids = LRUCache(config.TG_PHOTO_FILE_ID_CACHE_SIZE, config.TG_PHOTO_FILE_ID_TTL)
+        self.sent_edits = LRUCache(config.TG_SENT_EDITS_CACHE_SIZE, config.TG_SENT_EDITS_TTL)
+        self.dropped_updates = 0
 
     async def start(self):
-        self.manage_queue = asyncio.Queue()
-        self.send_queue = asyncio.Queue()
+        self.http = AsyncClient(
+            http2=config.TG_HTTP2,
+            limits=Limits(
+                max_connections=config.TG_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=config.TG_POOL_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=config.TG_POOL_KEEPALIVE_EXPIRY,
+            ),
+            timeout=self._get_timeout(),
+        )
+        self.manage_queues = [asyncio.Queue() for _ in range(self.managers_count)]
+        self.send_scheduler = SendScheduler(
+            global_rate=config.TG_GLOBAL_RATE,
+            global_burst=config.TG_GLOBAL_BURST,
+            chat_rate=config.TG_CHAT_RATE,
+            chat_burst=config.TG_CHAT_BURST,
+            group_rate=config.TG_GROUP_RATE_PER_MINUTE / 60,
+            group_burst=config.TG_GROUP_BURST,
+            lane_limits=config.TG_LANE_LIMITS,
+            max_wait=config.TG_LANE_MAX_WAIT,
+            batch_window=config.TG_BATCH_WINDOW,
+        )
         self.is_running = True
-        self.listen_task = asyncio.create_task(self._listen())
-        for _ in range(self.managers_count):
-            self.manage_tasks.append(asyncio.create_task(self._manage_updates()))
+        if self.is_polling:
+            self.listen_task = asyncio.create_task(self._listen())
+        for queue in self.manage_queues:
+            self.manage_tasks.append(asyncio.create_task(self._manage_updates(queue)))
         for _ in range(self.senders_count):
             self.send_tasks.append(asyncio.create_task(self._send_messages()))
 
     async def stop(self):
         self.is_running = False
-        await self.listen_task
-        await self.manage_queue.join()
-        await self.send_queue.join()
-        for _ in self.manage_tasks:
-            await self.manage_queue.put(None)
-        for _ in self.send_tasks:
-            await self.send_queue.put(None)
+        if self.listen_task:
+            await self.listen_task
+        for queue in self.manage_queues:
+            await queue.join()
+        await self.send_scheduler.join()
+        for queue in self.manage_queues:
+            await queue.put(None)
+        self.send_scheduler.close()
         for task in self.manage_tasks:
             await task
         for task in self.send_tasks:
             await task
+        await self.http.aclose()
+        logger.info('metrics %s', self.get_metrics())
+
+    def get_metrics(self) -> dict:
+        """Get client metrics."""
+        return {
+            **self.pool_stats.as_dict(),
+            'update_queue_depths': [queue.qsize() for queue in self.manage_queues],
+            'send_queue_depth': self.send_scheduler.depth,
+            'send_lane_depths': self.send_scheduler.lane_depths,
+            'send_retries': self.send_scheduler.retries_count,
+            'photo_file_ids': self.photo_file_ids.stats.as_dict(),
+            'send_coalesced': self.send_scheduler.coalesced_count,
+            'send_batched': self.send_scheduler.batched_count,
+            'sent_edits': self.sent_edits.stats.as_dict(),
+            'dropped_updates': self.dropped_updates,
+        }
 
     async def send(self, method: Type[TGAPI], data: RequestSchema) -> SendTaskSchema:
         """Send request to Telegram API."""
         task = SendTaskSchema(method=method, data=data)
-        await self.send_queue.put(task)
+        self.send_scheduler.put(task)
         return task
 
+    async def call(self, method: Type[TGAPI], data: RequestSchema) -> Optional[ResponseSchema]:
+        """Call Telegram API method directly, bypassing send queue."""
+        response = await self._request(
+            url=self._make_url(method.name), json=data.model_dump(exclude_none=True),
+            timeout=self._get_timeout(method.name))
+        try:
+            return method.response_schema.model_validate(response)
+        except ValidationError as error:
+            logger.error('response_validation-E %s', error)
+
+    async def put_update(self, update: Union[TGMessageSchema, TGCallbackQuerySchema, None]):
+        """Put update to its shard queue, updates of one shard are processed in order."""
+        if not update:
+            self.dropped_updates += 1
+            return
+        if config.TG_UPDATES_SHARD_BY == 'user':
+            shard_key = update.msg_from.tg_id
+        elif isinstance(update, TGMessageSchema):
+            shard_key = update.chat.tg_id
+        else:
+            shard_key = update.message.chat.tg_id
+        await self.manage_queues[shard_key % len(self.manage_queues)].put(update)
+
     async def _listen(self):
         url = self._make_url('getUpdates')
+        # getUpdates is refused while webhook is set, e.g. after switching back from webhook mode
+        await self.call(tg_api.DeleteWebhook, DeleteWebhookRequestSchema())
         while self.is_running:
-            json = {'offset': self.offset, 'timeout': POLLER_REQUEST_TIMEOUT}
-            response_dict = await self._request(url=url, json=json)
-            logger.debug('response dict %s', response_dict)
-            if response_dict and response_dict.get('ok'):
-                for result in response_dict.get('result', []):
-                    update_id = result.get('update_id')
-                    self.offset = update_id + 1 if update_id else self.offset
-                    try:
-                        update = TGUpdateSchema.model_validate(result)
-                        await self.manage_queue.put(update.message or update.callback_query)
-                    except Exception as error:
-                        # TODO: bot report
-                        logger.error('response_validation-E %s', error)
-                        await asyncio.sleep(self._sleep_for)
+            json = {'offset': self.offset, 'timeout': POLLER_REQUEST_TIMEOUT,
+                    'allowed_updates': config.TG_ALLOWED_UPDATES}
+            content = await self._request(
+                url=url, json=json, timeout=self._get_timeout('getUpdates'), raw=True)
+            response = self._parse_updates(content) if content else None
+            if response and response.ok:
+                for update in response.result:
+                    self.offset = update.update_id + 1
+                    await self.put_update(update.handled_update)
             else:
-                logger.error('response_dict %s', response_dict)
+                logger.error('get updates-E %s', response or content)
                 await asyncio.sleep(self._sleep_for)
 
-    async def _send(self, send_task: SendTaskSchema):
-        params = dict(url=self._make_url(send_task.method.name))
+    @staticmethod
+    def _parse_updates(content: bytes) -> Optional[GetUpdatesResponseSchema]:
+        """Decode getUpdates response in one validating pass.
+
+        If some update is invalid, updates are validated one by one and invalid ones are kept
+        without payload, so offset still moves past them.
+        """
+        try:
+            return GetUpdatesResponseSchema.model_validate_json(content)
+        except ValidationError as error:
+            # TODO: bot report
+            logger.error('response_validation-E %s', error)
+        try:
+            response_dict = json_lib.loads(content)
+        except JSONDecodeError as error:
+            logger.error('json_decode-E %s %s', error, content)
+            return None
+        updates = []
+        for result in response_dict.get('result', []):
+            try:
+                updates.append(TGUpdateSchema.model_validate(result))
+            except ValidationError:
+                if isinstance(update_id := result.get('update_id'), int):
+                    updates.append(TGUpdateSchema.model_construct(update_id=update_id))
+        return GetUpdatesResponseSchema.model_construct(ok=bool(response_dict.get('ok')), result=updates)
+
+    async def _send(self, send_task: SendTaskSchema) -> Optional[float]:
+        """Send request, return retry delay if Telegram flood control rejected it."""
+        params = dict(url=self._make_url(send_task.method.name),
+                      timeout=self._get_timeout(send_task.method.name))
         payload_key = 'data' if getattr(send_task.data, 'is_form', False) else 'json'
         params[payload_key] = send_task.data.model_dump(
             exclude_none=True, exclude={'files', 'is_form'})
         if getattr(send_task.data, 'files', None):
             params['files'] = send_task.data.files.model_dump()
+        if sent := self._get_sent_edit(send_task, params[payload_key]):
+            logger.debug('%s skipped, message is not modified', send_task.method.name)
+            send_task.set_response(sent)
+            return
+        photo_key = file_id = None
+        if send_task.method is tg_api.SendPhoto:
+            photo_key = hashlib.sha256(params['files']['photo']).hexdigest()
+            if file_id := self.photo_file_ids.get(photo_key):
+                params[payload_key]['photo'] = file_id
+                files = params.pop('files')
         response = await self._request(**params)
+        if file_id and self._is_wrong_file_id(response):
+            logger.warning('photo_file_id-W %s rejected, upload photo', file_id)
+            self.photo_file_ids.pop(photo_key)
+            params[payload_key].pop('photo')
+            params['files'] = files
+            file_id = None
+            response = await self._request(**params)
+        if retry_after := self._get_retry_after(response):
+            logger.warning('flood_control-W %s retry after %s', send_task.method.name, retry_after)
+            return retry_after
+        self._forget_deleted(send_task, response)
+        validated = None
         if send_task.method.response_schema:
             try:
                 validated = send_task.method.response_schema.model_validate(response)
             except ValidationError as error:
                 logger.error('response_validation-E %s', error)
             else:
-                send_task.response = validated
-        send_task.event.set()
+                self._remember_sent(send_task, params[payload_key], validated, None if file_id else photo_key)
+        send_task.set_response(validated)
+
+    def _remember_sent(
+            self, send_task: SendTaskSchema, payload: dict, response: ResponseSchema,
+            photo_key: Optional[str]) -> None:
+        """Remember uploaded photo file_id and message edit for requests to come."""
+        if photo_key and response.result and response.result.photo:
+            self.photo_file_ids.set(photo_key, response.result.photo[-1].file_id)
+        if send_task.method.is_coalesced and response.ok:
+            self.sent_edits.set(self._get_message_key(send_task), (payload, response))
+
+    def _forget_deleted(self, send_task: SendTaskSchema, response: Optional[dict]) -> None:
+        """Forget edits sent to messages deleted by request."""
+        if not (response or {}).get('ok') or not (message_ids := getattr(send_task.data, 'message_ids', None)):
+            return
+        for message_id in message_ids:
+            self.sent_edits.pop((send_task.data.chat_id, message_id))
 
-    async def _manage_updates(self):
-        while self.is_running or not self.manage_queue.empty():
+    def _get_sent_edit(self, send_task: SendTaskSchema, payload: dict) -> Optional[ResponseSchema]:
+        """Get response of the same edit sent last to the message, other requests to it forget the edit."""
+        if not (message_key := self._get_message_key(send_task)):
+            return None
+        if not send_task.method.is_coalesced:
+            self.sent_edits.pop(message_key)
+        elif (sent := self.sent_edits.get(message_key)) and sent[0] == payload:
+            return sent[1]
+
+    @staticmethod
+    def _get_message_key(send_task: SendTaskSchema) -> Optional[tuple]:
+        if message_id := getattr(send_task.data, 'message_id', None):
+            return send_task.data.chat_id, message_id
+
+    async def _manage_updates(self, queue: asyncio.Queue):
+        while self.is_running or not queue.empty():
             try:
-                if message := await self.manage_queue.get():
+                if message := await queue.get():
                     await self.accountant.process_message(message)
             except Exception as error:
                 logger.exception(error)
             finally:
-                self.manage_queue.task_done()
+                queue.task_done()
 
     async def _send_messages(self):
-        while self.is_running or not self.send_queue.empty():
+        while send_task := await self.send_scheduler.get():
+            retry_after = None
             try:
-                if send_task := await self.send_queue.get():
-                    await self._send(send_task)
+                if send_task.is_done:
+                    logger.warning('send_task-W %s dropped, deadline passed', send_task.method.name)
+                else:
+                    retry_after = await self._send(send_task)
             except Exception as error:
                 logger.exception(error)
+                send_task.set_error(SendTaskError(repr(error)))
             finally:
-                self.send_queue.task_done()
-                await asyncio.sleep(0.2)
+                if retry_after:
+                    self.send_scheduler.retry(send_task, retry_after)
+                else:
+                    self.send_scheduler.done(send_task)
+
+    @staticmethod
+    def _get_retry_after(response: Optional[dict]) -> Optional[float]:
+        """Get retry_after of Telegram "Too Many Requests" response."""
+        if response and response.get('error_code') == 429:
+            return (response.get('parameters') or {}).get('retry_after') or 1
+
+    @staticmethod
+    def _is_wrong_file_id(response: Optional[dict]) -> bool:
+        """Check Telegram rejected file_id of sent file, e.g. "Bad Request: wrong file identifier"."""
+        if not response or response.get('error_code') != 400:
+            return False
+        return 'file identifier' in (response.get('description') or '').lower()
 
     def _make_url(self, method: str):
         return custom_urljoin(self.base_url, method)
 
+    @staticmethod
+    def _get_timeout(method: Optional[str] = None) -> Timeout:
+        """Get request timeout for Telegram API method."""
+        timeout = config.TG_METHOD_TIMEOUTS.get(method, config.TG_DEFAULT_REQUEST_TIMEOUT)
+        return Timeout(timeout, connect=config.TG_CONNECT_TIMEOUT)
+
     async def _request(
         self,
         *,
@@ -157,24 +431,31 @@ class TelegramClient:
         json: Optional[dict] = None,
         data: Optional[dict] = None,
         files: Optional[dict] = None,
-        timeout: int = POLLER_REQUEST_TIMEOUT * 2,
+        timeout: Optional[Timeout] = None,
+        raw: bool = False,
     ) -> Response:
         files = files or {}
         logger.debug(
             'request %s %s json: %s form: %s files: %s',
             method, url, json, data, files.keys(),
         )
+        trace = _RequestTrace()
+        response = None
         try:
-            async with AsyncClient() as client:
-                response = await client.request(method=method, url=url, timeout=timeout,
-                                                headers=headers, json=json, data=data,
-                                                files=files)
-                content = response.json()
-                logger.debug('response %s %s', response.status_code, content)
-                if response.status_code != 200:
-                    logger.error('request-E %s %s', response.status_code, content)
-                return content
+            response = await self.http.request(method=method, url=url, timeout=timeout,
+                                               headers=headers, json=json, data=data,
+                                               files=files, extensions={'trace': trace})
+            content = response.content if raw else response.json()
+            logger.debug('response %s %s', response.status_code, content)
+            if response.status_code != 200:
+                logger.error('request-E %s %s', response.status_code, content)
+            return content
         except RequestError as error:
             logger.error('request-E %s %s', error.__class__, error)
         except JSONDecodeError as error:
             logger.error('json_decode-E %s %s', error, response.content)
+        finally:
+            if trace.is_new_connection:
+                self.pool_stats.misses += 1
+            elif response is not None:
+                self.pool_stats.hits += 1
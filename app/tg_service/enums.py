@@ -15,3 +15,11 @@ class TGEntityTypeEnum(str, enum.Enum):
     BOT_COMMAND = 'bot_command'
     MENTION = 'mention'
     CODE = 'code'
+
+
+class SendLaneEnum(str, enum.Enum):
+    """Outgoing requests lanes, in priority order."""
+
+    INTERACTIVE = 'interactive'
+    CLEANUP = 'cleanup'
+    MEDIA = 'media'
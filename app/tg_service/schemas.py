@@ -40,6 +40,14 @@ class TGEntitySchema(BaseModel):
     type: TGEntityTypeEnum
 
 
+class TGPhotoSizeSchema(BaseModel):
+    file_id: str
+    file_unique_id: str
+    width: int
+    height: int
+    file_size: Optional[int] = Field(None)
+
+
 class TGMessageSchema(BaseModel):
     message_id: int
     msg_from: TGFromSchema = Field(alias='from')
@@ -48,6 +56,7 @@ class TGMessageSchema(BaseModel):
     reply_to_message: Optional[TGReplyToMessageSchema] = Field(None)
     entities: list[TGEntitySchema] = Field(default_factory=list)
     text: Optional[str] = Field(None)
+    photo: list[TGPhotoSizeSchema] = Field(default_factory=list)
     reply_markup: Optional['InlineKeyboardMarkup'] = Field(None)
 
     @cached_property
@@ -71,6 +80,15 @@ class TGUpdateSchema(BaseModel):
     message: Optional[TGMessageSchema] = Field(None)
     callback_query: Optional[TGCallbackQuerySchema] = Field(None)
 
+    @property
+    def handled_update(self) -> Union[TGMessageSchema, TGCallbackQuerySchema, None]:
+        """Get message or callback query if any handler path can process it."""
+        if self.callback_query:
+            return self.callback_query
+        # every message handler reads text or command, other messages are ignored
+        if self.message and self.message.text:
+            return self.message
+
 
 class PhotoFileSchema(BaseModel):
     """Photo file schema."""
@@ -129,6 +147,11 @@ class DeleteMessageRequestSchema(RequestSchema):
     message_id: int
 
 
+class DeleteMessagesRequestSchema(RequestSchema):
+    chat_id: Union[int, str]
+    message_ids: list[int]
+
+
 class EditMessageTextRequestSchema(RequestSchema):
     """Edit message text schema."""
 
@@ -168,3 +191,31 @@ class SendPhotoRequestSchema(RequestSchema):
 class SendPhotoResponseSchema(ResponseSchema):
     ok: bool
     result: Optional[TGMessageSchema] = Field(None)
+
+
+class BoolResponseSchema(ResponseSchema):
+    ok: bool
+    result: Optional[bool] = Field(None)
+    description: Optional[str] = Field(None)
+
+
+class GetUpdatesResponseSchema(ResponseSchema):
+    ok: bool
+    result: list[TGUpdateSchema] = Field(default_factory=list)
+    description: Optional[str] = Field(None)
+
+
+class SetWebhookRequestSchema(RequestSchema):
+    """Set webhook request schema."""
+
+    url: str
+    secret_token: Optional[str] = Field(None)
+    max_connections: Optional[int] = Field(None)
+    drop_pending_updates: Optional[bool] = Field(None)
+    allowed_updates: Optional[list[str]] = Field(None)
+
+
+class DeleteWebhookRequestSchema(RequestSchema):
+    """Delete webhook request schema."""
+
+    drop_pending_updates: Optional[bool] = Field(None)
@@ -0,0 +1,282 @@
+import asyncio
+from collections import deque
+import time
+from typing import TYPE_CHECKING, Optional, Union
+
+from .enums import SendLaneEnum
+
+
+if TYPE_CHECKING:
+    from .client import SendTaskSchema
+
+ChatId = Union[int, str, None]
+QueueKey = tuple[ChatId, SendLaneEnum]
+
+
+class TokenBucket:
+    """Token bucket rate limiter."""
+
+    rate: float
+    capacity: float
+    tokens: float
+    updated_at: float
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    @property
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+    def delay(self) -> float:
+        """Get seconds until one token is available."""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self) -> None:
+        """Take one token."""
+        self._refill()
+        self.tokens -= 1
+
+    def pause(self, seconds: float) -> None:
+        """Make next token available not earlier than in provided seconds."""
+        self._refill()
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+class SendScheduler:
+    """Outgoing requests scheduler with per-chat and global flood control.
+
+    Tasks of one chat and lane are sent in order and one at a time, chats
+    are handed out to senders independently, so a throttled chat never
+    holds back the others. Lanes are served in priority order within their
+    concurrency limits, a lane not served for max_wait goes first whatever
+    its priority is.
+
+    Coalesced method task replaces pending task of the same method to the
+    same message. Batched method task is merged into pending task of the
+    same method, an idle chat lane waits batch_window to gather more. Both
+    replaced and merged tasks follow result of the task sent instead.
+    """
+
+    MAX_IDLE_CHATS = 1000
+
+    _pending: dict[QueueKey, deque['SendTaskSchema']]
+    _chat_buckets: dict[ChatId, list[TokenBucket]]
+    _active: set[QueueKey]
+    _ready: dict[SendLaneEnum, deque[tuple[float, QueueKey]]]
+    _in_flight: dict[SendLaneEnum, int]
+    _served_at: dict[SendLaneEnum, float]
+    retries_count: int
+    coalesced_count: int
+    batched_count: int
+
+    def __init__(self, global_rate: float, global_burst: float,
+                 chat_rate: float, chat_burst: float,
+                 group_rate: float, group_burst: float,
+                 lane_limits: Optional[dict[str, int]] = None, max_wait: float = 2,
+                 batch_window: float = 0) -> None:
+        self.chat_rate, self.chat_burst = chat_rate, chat_burst
+        self.group_rate, self.group_burst = group_rate, group_burst
+        lane_limits = lane_limits or {}
+        self.lane_limits = {lane: lane_limits.get(lane.value, 1) for lane in SendLaneEnum}
+        self.max_wait = max_wait
+        self.batch_window = batch_window
+        self._global = TokenBucket(global_rate, global_burst)
+        self._global_lock = asyncio.Lock()
+        self._pending = {}
+        self._chat_buckets = {}
+        self._active = set()
+        self._ready = {lane: deque() for lane in SendLaneEnum}
+        self._in_flight = {lane: 0 for lane in SendLaneEnum}
+        self._served_at = {lane: 0.0 for lane in SendLaneEnum}
+        self._wakeup = asyncio.Event()
+        self._is_closed = False
+        self._unfinished = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.retries_count = 0
+        self.coalesced_count = 0
+        self.batched_count = 0
+
+    @property
+    def depth(self) -> int:
+        """Amount of tasks waiting to be sent."""
+        return sum(len(tasks) for tasks in self._pending.values())
+
+    @property
+    def lane_depths(self) -> dict[str, int]:
+        """Amount of tasks waiting to be sent by lane."""
+        depths = {lane.value: 0 for lane in SendLaneEnum}
+        for (_, lane), tasks in self._pending.items():
+            depths[lane.value] += len(tasks)
+        return depths
+
+    def put(self, task: 'SendTaskSchema') -> None:
+        """Add task to its chat lane queue."""
+        key = self._get_key(task)
+        if task.method.is_coalesced and (superseded := self._replace_pending(key, task)):
+            superseded.resolve_with(task)
+            self.coalesced_count += 1
+            return
+        if task.method.batch_field and (batch := self._add_to_batch(key, task)):
+            task.resolve_with(batch)
+            self.batched_count += 1
+            return
+        self._unfinished += 1
+        self._idle.clear()
+        self._pending.setdefault(key, deque()).append(task)
+        if key not in self._active:
+            self._active.add(key)
+            delay = self._get_chat_delay(key[0])
+            self._schedule(key, max(delay, self.batch_window) if task.method.batch_field else delay)
+
+    async def get(self) -> Optional['SendTaskSchema']:
+        """Wait for next task allowed to be sent, None means scheduler is closed."""
+        while True:
+            if self._is_closed:
+                return None
+            if (key := self._pop_ready()) is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            chat_id, lane = key
+            if (delay := self._get_chat_delay(chat_id)) > 0:
+                self._schedule(key, delay)
+                continue
+            self._in_flight[lane] += 1
+            await self._acquire_global()
+            for bucket in self._get_chat_buckets(chat_id):
+                bucket.consume()
+            return self._pending[key].popleft()
+
+    def done(self, task: 'SendTaskSchema') -> None:
+        """Mark task as sent and release its chat lane."""
+        key = self._get_key(task)
+        self._unfinished -= 1
+        self._release(key[1])
+        if self._pending[key]:
+            self._schedule(key, self._get_chat_delay(key[0]))
+        else:
+            del self._pending[key]
+            self._active.discard(key)
+            if len(self._chat_buckets) > self.MAX_IDLE_CHATS:
+                self._sweep()
+        if not self._unfinished:
+            self._idle.set()
+
+    def retry(self, task: 'SendTaskSchema', retry_after: float) -> None:
+        """Put flood limited task back to the head of its chat lane queue."""
+        key = self._get_key(task)
+        self.retries_count += 1
+        self._release(key[1])
+        self._pending[key].appendleft(task)
+        for bucket in self._get_chat_buckets(key[0]):
+            bucket.pause(retry_after)
+        self._schedule(key, retry_after)
+
+    async def join(self) -> None:
+        """Wait until all tasks are sent."""
+        await self._idle.wait()
+
+    def close(self) -> None:
+        """Stop senders waiting for tasks."""
+        self._is_closed = True
+        self._wakeup.set()
+
+    def _replace_pending(self, key: QueueKey, task: 'SendTaskSchema') -> Optional['SendTaskSchema']:
+        """Replace last pending task to the same message if it is of the same method, return replaced one."""
+        pending = self._pending.get(key, ())
+        message_id = getattr(task.data, 'message_id', None)
+        for index in range(len(pending) - 1, -1, -1):
+            queued = pending[index]
+            if getattr(queued.data, 'message_id', None) != message_id:
+                continue
+            if queued.method is not task.method:
+                return None
+            pending[index] = task
+            return queued
+        return None
+
+    def _add_to_batch(self, key: QueueKey, task: 'SendTaskSchema') -> Optional['SendTaskSchema']:
+        """Add task items to pending batch of the same method having room for them, return the batch."""
+        field, size = task.method.batch_field, task.method.batch_size
+        items = getattr(task.data, field)
+        for queued in self._pending.get(key, ()):
+            if queued.method is task.method and len(getattr(queued.data, field)) + len(items) <= size:
+                getattr(queued.data, field).extend(items)
+                return queued
+        return None
+
+    def _schedule(self, key: QueueKey, delay: float) -> None:
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._set_ready, key)
+        else:
+            self._set_ready(key)
+
+    def _set_ready(self, key: QueueKey) -> None:
+        self._ready[key[1]].append((time.monotonic(), key))
+        self._wakeup.set()
+
+    def _release(self, lane: SendLaneEnum) -> None:
+        self._in_flight[lane] -= 1
+        self._wakeup.set()
+
+    def _pop_ready(self) -> Optional[QueueKey]:
+        """Pop ready chat of the first lane under its limit, lane not served for max_wait goes first."""
+        lanes = [
+            lane for lane in SendLaneEnum
+            if self._ready[lane] and self._in_flight[lane] < self.lane_limits[lane]
+        ]
+        if not lanes:
+            return None
+        # lane waits since it was last served or got its ready chat, whichever is later
+        waited_since = {lane: max(self._served_at[lane], self._ready[lane][0][0]) for lane in lanes}
+        lane = min(lanes, key=waited_since.get)
+        if time.monotonic() - waited_since[lane] < self.max_wait:
+            lane = lanes[0]
+        self._served_at[lane] = time.monotonic()
+        return self._ready[lane].popleft()[1]
+
+    async def _acquire_global(self) -> None:
+        async with self._global_lock:
+            while (delay := self._global.delay()) > 0:
+                await asyncio.sleep(delay)
+            self._global.consume()
+
+    def _get_chat_delay(self, chat_id: ChatId) -> float:
+        return max(bucket.delay() for bucket in self._get_chat_buckets(chat_id))
+
+    def _get_chat_buckets(self, chat_id: ChatId) -> list[TokenBucket]:
+        if not (buckets := self._chat_buckets.get(chat_id)):
+            buckets = [TokenBucket(self.chat_rate, self.chat_burst)]
+            if self._is_group(chat_id):
+                buckets.append(TokenBucket(self.group_rate, self.group_burst))
+            self._chat_buckets[chat_id] = buckets
+        return buckets
+
+    def _sweep(self) -> None:
+        """Forget buckets of idle chats which are already refilled."""
+        active_chats = {chat_id for chat_id, _ in self._active}
+        for chat_id in list(self._chat_buckets):
+            buckets = self._chat_buckets[chat_id]
+            if chat_id not in active_chats and all(b.is_full for b in buckets):
+                del self._chat_buckets[chat_id]
+
+    @staticmethod
+    def _get_key(task: 'SendTaskSchema') -> QueueKey:
+        return getattr(task.data, 'chat_id', None), task.method.lane
+
+    @staticmethod
+    def _is_group(chat_id: ChatId) -> bool:
+        """Group, supergroup and channel ids are negative or @usernames."""
+        return isinstance(chat_id, str) or (chat_id is not None and chat_id < 0)
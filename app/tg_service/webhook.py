@@ -0,0 +1,125 @@
+import asyncio
+from collections import deque
+import hmac
+from http import HTTPStatus
+from logging import getLogger
+from typing import TYPE_CHECKING, Optional
+
+from pydantic import ValidationError
+
+from .schemas import TGUpdateSchema
+
+
+if TYPE_CHECKING:
+    from .client import TelegramClient
+
+logger = getLogger('tg_client')
+
+
+class WebhookServer:
+    """Embedded HTTP server receiving Telegram updates pushed to webhook."""
+
+    SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+    MAX_BODY_SIZE = 1024 * 1024
+    DEDUP_SIZE = 10000
+
+    tg_client: 'TelegramClient'
+    host: str
+    path: str
+    secret_token: str
+    server: Optional[asyncio.Server] = None
+
+    def __init__(self, tg_client: 'TelegramClient', host: str, port: int, path: str,
+                 secret_token: str) -> None:
+        self.tg_client = tg_client
+        self.host = host
+        self._port = port
+        self.path = path
+        self.secret_token = secret_token
+        self._seen_ids = set()
+        self._seen_order = deque()
+        self._writers = set()
+
+    @property
+    def port(self) -> int:
+        """Bound port, useful when server was started on port 0."""
+        if self.server and self.server.sockets:
+            return self.server.sockets[0].getsockname()[1]
+        return self._port
+
+    async def start(self) -> None:
+        """Start accepting webhook requests."""
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self._port)
+        logger.info('webhook server listening %s:%s%s', self.host, self.port, self.path)
+
+    async def stop(self) -> None:
+        """Stop accepting requests and close keep-alive connections."""
+        if not self.server:
+            return
+        self.server.close()
+        for writer in list(self._writers):
+            writer.close()
+        await self.server.wait_closed()
+        self.server = None
+
+    async def _handle_connection(
+            self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._writers.add(writer)
+        try:
+            while request := await self._read_request(reader):
+                status = await self._process(*request)
+                writer.write(
+                    f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+                    'Content-Length: 0\r\nConnection: keep-alive\r\n\r\n'.encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as error:
+            logger.debug('webhook connection-E %s', error)
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _read_request(
+            self, reader: asyncio.StreamReader) -> Optional[tuple[str, str, dict, bytes]]:
+        """Read one HTTP/1.1 request, None on closed connection."""
+        if not (request_line := await reader.readline()):
+            return None
+        method, target, _ = request_line.decode('latin-1').split(' ', 2)
+        headers = {}
+        while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0))
+        if length > self.MAX_BODY_SIZE:
+            raise ValueError(f'request body too large {length}')
+        body = await reader.readexactly(length)
+        return method, target.split('?', 1)[0], headers, body
+
+    async def _process(self, method: str, path: str, headers: dict, body: bytes) -> HTTPStatus:
+        if path != self.path:
+            return HTTPStatus.NOT_FOUND
+        if method != 'POST':
+            return HTTPStatus.METHOD_NOT_ALLOWED
+        if not hmac.compare_digest(headers.get(self.SECRET_HEADER, ''), self.secret_token):
+            logger.warning('webhook secret token mismatch')
+            return HTTPStatus.FORBIDDEN
+        try:
+            update = TGUpdateSchema.model_validate_json(body)
+        except ValidationError as error:
+            # answer OK anyway, otherwise Telegram keeps redelivering the update
+            logger.error('response_validation-E %s', error)
+            return HTTPStatus.OK
+        if self._is_duplicate(update.update_id):
+            logger.debug('webhook duplicate update %s', update.update_id)
+            return HTTPStatus.OK
+        await self.tg_client.put_update(update.handled_update)
+        return HTTPStatus.OK
+
+    def _is_duplicate(self, update_id: int) -> bool:
+        """Check update was already received and remember it."""
+        if update_id in self._seen_ids:
+            return True
+        self._seen_ids.add(update_id)
+        self._seen_order.append(update_id)
+        if len(self._seen_order) > self.DEDUP_SIZE:
+            self._seen_ids.discard(self._seen_order.popleft())
+        return False
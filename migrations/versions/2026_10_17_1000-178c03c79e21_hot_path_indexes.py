@@ -0,0 +1,51 @@
+"""hot_path_indexes
+
+Revision ID: 178c03c79e21
+Revises: e8c14dc48a79
+Create Date: 2026-10-17 10:00:12.418305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '178c03c79e21'
+down_revision: Union[str, None] = 'e8c14dc48a79'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade."""
+    op.create_index(op.f('ix_tg_chats_tg_id'), 'tg_chats', ['tg_id'])
+    op.create_index(op.f('ix_tg_users_tg_id'), 'tg_users', ['tg_id'])
+    op.create_index(op.f('ix_tg_user_states_tg_user_id'), 'tg_user_states', ['tg_user_id'])
+    op.create_index(op.f('ix_chat_budget_items_chat_id'), 'chat_budget_items', ['chat_id'])
+    op.create_index(
+        'ix_entries_chat_budget_item_id_created_at', 'entries',
+        ['chat_budget_item_id', 'created_at'],
+    )
+    op.create_index('ix_valute_rates_valute_to_id_date', 'valute_rates', ['valute_to_id', 'date'])
+    op.create_index(
+        'ix_valute_exchanges_valutes_created_at', 'valute_exchanges',
+        ['valute_from_id', 'valute_to_id', 'created_at'],
+    )
+    op.create_index(op.f('ix_chat_balances_chat_id'), 'chat_balances', ['chat_id'])
+    op.create_index(op.f('ix_chat_fonds_chat_id'), 'chat_fonds', ['chat_id'])
+    op.create_index(op.f('ix_chat_debts_chat_id'), 'chat_debts', ['chat_id'])
+
+
+def downgrade() -> None:
+    """Downgrade."""
+    op.drop_index(op.f('ix_chat_debts_chat_id'), table_name='chat_debts')
+    op.drop_index(op.f('ix_chat_fonds_chat_id'), table_name='chat_fonds')
+    op.drop_index(op.f('ix_chat_balances_chat_id'), table_name='chat_balances')
+    op.drop_index('ix_valute_exchanges_valutes_created_at', table_name='valute_exchanges')
+    op.drop_index('ix_valute_rates_valute_to_id_date', table_name='valute_rates')
+    op.drop_index('ix_entries_chat_budget_item_id_created_at', table_name='entries')
+    op.drop_index(op.f('ix_chat_budget_items_chat_id'), table_name='chat_budget_items')
+    op.drop_index(op.f('ix_tg_user_states_tg_user_id'), table_name='tg_user_states')
+    op.drop_index(op.f('ix_tg_users_tg_id'), table_name='tg_users')
+    op.drop_index(op.f('ix_tg_chats_tg_id'), table_name='tg_chats')
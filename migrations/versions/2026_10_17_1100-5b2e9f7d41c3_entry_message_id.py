@@ -0,0 +1,45 @@
+"""entry_message_id
+
+Revision ID: 5b2e9f7d41c3
+Revises: 178c03c79e21
+Create Date: 2026-10-17 11:00:41.902117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b2e9f7d41c3'
+down_revision: Union[str, None] = '178c03c79e21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade."""
+    op.add_column('entries', sa.Column('chat_id', sa.BigInteger(), nullable=True))
+    op.add_column('entries', sa.Column('message_id', sa.BigInteger(), nullable=True))
+    op.execute(
+        """
+        UPDATE entries
+        SET chat_id = chat_budget_items.chat_id,
+            message_id = (entries.data_raw ->> 'message_id')::bigint
+        FROM chat_budget_items
+        WHERE chat_budget_items.id = entries.chat_budget_item_id
+        """
+    )
+    op.alter_column('entries', 'chat_id', nullable=False)
+    op.create_foreign_key(
+        op.f('entries_chat_id_fkey'), 'entries', 'tg_chats', ['chat_id'], ['id'], ondelete='CASCADE')
+    op.create_index('ix_entries_chat_id_message_id', 'entries', ['chat_id', 'message_id'])
+
+
+def downgrade() -> None:
+    """Downgrade."""
+    op.drop_index('ix_entries_chat_id_message_id', table_name='entries')
+    op.drop_constraint(op.f('entries_chat_id_fkey'), 'entries', type_='foreignkey')
+    op.drop_column('entries', 'message_id')
+    op.drop_column('entries', 'chat_id')
@@ -0,0 +1,50 @@
+"""entry_month_totals
+
+Revision ID: 9c4a1e6b2d85
+Revises: 5b2e9f7d41c3
+Create Date: 2026-10-17 12:00:27.551931
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4a1e6b2d85'
+down_revision: Union[str, None] = '5b2e9f7d41c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade."""
+    op.create_table(
+        'entry_month_totals',
+        sa.Column('chat_id', sa.BigInteger(), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('chat_budget_item_id', sa.BigInteger(), nullable=False),
+        sa.Column('valute_id', sa.BigInteger(), nullable=False),
+        sa.Column('amount', sa.Float(), server_default=sa.text('0'), nullable=False),
+        sa.Column('entries_count', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.ForeignKeyConstraint(['chat_budget_item_id'], ['chat_budget_items.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['chat_id'], ['tg_chats.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['valute_id'], ['valutes.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('chat_id', 'month', 'chat_budget_item_id', 'valute_id')
+    )
+    op.execute(
+        """
+        INSERT INTO entry_month_totals
+            (chat_id, month, chat_budget_item_id, valute_id, amount, entries_count)
+        SELECT chat_id, date_trunc('month', created_at)::date, chat_budget_item_id, valute_id,
+               sum(amount), count(*)
+        FROM entries
+        GROUP BY 1, 2, 3, 4
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade."""
+    op.drop_table('entry_month_totals')
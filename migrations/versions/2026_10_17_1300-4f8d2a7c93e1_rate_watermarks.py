@@ -0,0 +1,50 @@
+"""rate_watermarks
+
+Revision ID: 4f8d2a7c93e1
+Revises: 9c4a1e6b2d85
+Create Date: 2026-10-17 13:00:41.208364
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f8d2a7c93e1'
+down_revision: Union[str, None] = '9c4a1e6b2d85'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade."""
+    op.create_table(
+        'valute_rate_watermarks',
+        sa.Column('valute_id', sa.BigInteger(), nullable=False),
+        sa.Column('rated_through', sa.Date(), nullable=False),
+        sa.ForeignKeyConstraint(['valute_id'], ['valutes.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('valute_id')
+    )
+    op.create_table(
+        'rate_date_queue',
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.PrimaryKeyConstraint('date')
+    )
+    op.create_table(
+        'valute_rate_failures',
+        sa.Column('valute_id', sa.BigInteger(), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('attempts', sa.Integer(), server_default=sa.text('1'), nullable=False),
+        sa.Column('retry_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['valute_id'], ['valutes.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('valute_id', 'date')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade."""
+    op.drop_table('valute_rate_failures')
+    op.drop_table('rate_date_queue')
+    op.drop_table('valute_rate_watermarks')
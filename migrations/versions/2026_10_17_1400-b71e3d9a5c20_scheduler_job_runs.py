@@ -0,0 +1,33 @@
+"""scheduler_job_runs
+
+Revision ID: b71e3d9a5c20
+Revises: 4f8d2a7c93e1
+Create Date: 2026-10-17 14:00:08.731952
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b71e3d9a5c20'
+down_revision: Union[str, None] = '4f8d2a7c93e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade."""
+    op.create_table(
+        'scheduler_job_runs',
+        sa.Column('job_id', sa.String(), nullable=False),
+        sa.Column('last_run_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('job_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade."""
+    op.drop_table('scheduler_job_runs')
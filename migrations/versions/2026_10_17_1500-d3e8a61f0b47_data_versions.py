@@ -0,0 +1,33 @@
+"""data_versions
+
+Revision ID: d3e8a61f0b47
+Revises: b71e3d9a5c20
+Create Date: 2026-10-17 15:00:12.402318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3e8a61f0b47'
+down_revision: Union[str, None] = 'b71e3d9a5c20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade."""
+    op.create_table(
+        'data_versions',
+        sa.Column('scope', sa.String(), nullable=False),
+        sa.Column('version', sa.BigInteger(), server_default=sa.text('1'), nullable=False),
+        sa.PrimaryKeyConstraint('scope')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade."""
+    op.drop_table('data_versions')
@@ -0,0 +1,31 @@
+"""drop_watermark_rated_through
+
+Revision ID: 6a0c5e92f1d8
+Revises: d3e8a61f0b47
+Create Date: 2026-10-17 16:00:04.118734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a0c5e92f1d8'
+down_revision: Union[str, None] = 'd3e8a61f0b47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade."""
+    op.drop_column('valute_rate_watermarks', 'rated_through')
+
+
+def downgrade() -> None:
+    """Downgrade."""
+    op.add_column(
+        'valute_rate_watermarks',
+        sa.Column('rated_through', sa.Date(), server_default=sa.text('CURRENT_DATE'), nullable=False),
+    )
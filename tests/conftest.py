@@ -0,0 +1,20 @@
+import os
+import pathlib
+
+import pytest
+
+
+# app config requires these, tests do not connect to database or Telegram
+os.environ.setdefault('POSTGRES_USER', 'test')
+os.environ.setdefault('POSTGRES_PASSWORD', 'test')
+os.environ.setdefault('POSTGRES_DB', 'test')
+os.environ.setdefault('TG_TOKEN', 'test')
+
+FIXTURES_DIR = pathlib.Path(__file__).parent / 'fixtures'
+
+
+@pytest.fixture
+def read_fixture():
+    def read(name: str) -> str:
+        return (FIXTURES_DIR / name).read_text(encoding='utf-8')
+    return read
@@ -0,0 +1,42 @@
+import time
+
+from app.core.cache import LRUCache
+from app.db_service.cache import ContextCache
+from app.db_service.models import TGChat
+
+
+def _chat(chat_id: int) -> TGChat:
+    chat = TGChat(tg_id=-chat_id, type='group', title='budget')
+    chat.id = chat_id
+    return chat
+
+
+def test_on_evict_is_called_for_evicted_and_expired_entries():
+    evicted = []
+    cache = LRUCache(2, ttl=0.01, on_evict=lambda key, value: evicted.append((key, value)))
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.set('c', 3)
+    time.sleep(0.02)
+
+    assert cache.get('c') is None
+    assert evicted == [('a', 1), ('c', 3)]
+
+
+def test_chat_index_is_bounded_by_cache_size():
+    context = ContextCache(maxsize=3, ttl=None)
+    for chat_id in range(1, 11):
+        context.set_chat(_chat(chat_id))
+
+    assert len(context.chats) == 3
+    assert sorted(context._chat_tg_ids) == [8, 9, 10]
+
+
+def test_invalidate_chat_drops_cached_aggregate():
+    context = ContextCache(maxsize=3, ttl=None)
+    context.set_chat(_chat(1))
+
+    context.invalidate_chat(1)
+
+    assert context.get_chat(-1) is None
+    assert context._chat_tg_ids == {}
@@ -0,0 +1,32 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.accountant.enums import MessageHandlerEnum
+from app.accountant.handlers.base import CommandHandler
+from app.db_service.models import TGUserState
+
+
+class _StateRepo:
+    """Keep items passed to update, returning them as written."""
+
+    def __init__(self):
+        self.updated = []
+
+    async def update_item(self, altered):
+        self.updated.append(altered)
+        return altered
+
+
+def test_set_state_writes_new_instance_leaving_cached_state_intact():
+    cached = TGUserState(id=3, tg_user_id=2, name=MessageHandlerEnum.DEFAULT.value, data_raw={})
+    db = SimpleNamespace(state_repo=_StateRepo())
+    handler = CommandHandler(db=db, tg=None, editor=None, chat=None, user=None, update=None, state=cached)
+
+    asyncio.run(handler.set_state(MessageHandlerEnum.CATEGORY_ADD_NAME, {'message_id': 10}))
+
+    [altered] = db.state_repo.updated
+    assert altered is not cached
+    assert (altered.id, altered.tg_user_id) == (3, 2)
+    assert (altered.name, altered.data_raw) == (MessageHandlerEnum.CATEGORY_ADD_NAME.value, {'message_id': 10})
+    assert (cached.name, cached.data_raw) == (MessageHandlerEnum.DEFAULT.value, {})
+    assert handler.state is altered
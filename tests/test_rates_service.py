@@ -0,0 +1,148 @@
+import asyncio
+import datetime
+import json
+from urllib.parse import parse_qs
+
+import httpx
+
+from app.rates_service import RateSeeker
+from app.rates_service.base import ARSSeeker, RUBSeeker
+from app.scheduler.jobs import _fetch_rates
+
+
+def _date(value: str) -> datetime.date:
+    return datetime.date.fromisoformat(value)
+
+
+def _cbr_transport(content: str, requests: list) -> httpx.MockTransport:
+    """CBR XML_dynamic answering with fixture records of requested interval."""
+    seeker = RUBSeeker()
+    rates = seeker.extract_range_rates(content)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if 'XML_daily' in request.url.path:
+            return httpx.Response(500)
+        query = parse_qs(request.url.query.decode())
+        date0, date1 = (datetime.datetime.strptime(query[key][0], '%d/%m/%Y').date()
+                        for key in ('date_req1', 'date_req2'))
+        requests.append((date0, date1))
+        records = ''.join(
+            f'<Record Date="{day:%d.%m.%Y}" Id="R01235"><Nominal>1</Nominal>'
+            f'<Value>{str(rate).replace(".", ",")}</Value></Record>'
+            for day, rate in sorted(rates.items()) if date0 <= day <= date1
+        )
+        return httpx.Response(200, text=f'<ValCurs ID="R01235">{records}</ValCurs>')
+    return httpx.MockTransport(handler)
+
+
+async def _get_range_rates(transport: httpx.MockTransport, code: str, date0, date1):
+    seeker = RateSeeker()
+    async with httpx.AsyncClient(transport=transport) as seeker.http:
+        return await seeker.get_range_rates(code, date0, date1)
+
+
+def test_cbr_extract_range_rates(read_fixture):
+    rates = RUBSeeker().extract_range_rates(read_fixture('cbr_xml_dynamic.xml'))
+
+    assert len(rates) == 10
+    assert rates[_date('2023-12-25')] == 91.7069
+    assert rates[_date('2024-01-10')] == 89.2546
+    assert _date('2024-01-01') not in rates
+
+
+def test_cbr_make_range_url():
+    url = RUBSeeker().make_range_url(_date('2024-01-05'), _date('2024-01-09'))
+
+    assert 'date_req1=05/01/2024&date_req2=09/01/2024&VAL_NM_RQ=R01235' in url
+
+
+def test_bluelytics_extract_range_rates(read_fixture):
+    rates = ARSSeeker().extract_range_rates(json.loads(read_fixture('bluelytics_evolution.json')))
+
+    assert rates == {
+        _date('2024-03-08'): 990, _date('2024-03-07'): 985, _date('2024-03-06'): 980,
+        _date('2024-03-05'): 975, _date('2024-03-04'): 980, _date('2024-03-01'): 970,
+    }
+
+
+def test_fill_days_over_weekend(read_fixture):
+    rates = ARSSeeker().extract_range_rates(json.loads(read_fixture('bluelytics_evolution.json')))
+
+    filled = ARSSeeker.fill_days(rates, _date('2024-03-01'), _date('2024-03-05'))
+
+    assert filled == {
+        _date('2024-03-01'): 970, _date('2024-03-02'): 970, _date('2024-03-03'): 970,
+        _date('2024-03-04'): 980, _date('2024-03-05'): 975,
+    }
+
+
+def test_fill_days_over_new_year_holidays(read_fixture):
+    rates = RUBSeeker().extract_range_rates(read_fixture('cbr_xml_dynamic.xml'))
+
+    filled = RUBSeeker.fill_days(rates, _date('2023-12-29'), _date('2024-01-11'))
+
+    assert len(filled) == 14
+    assert {filled[_date('2023-12-29') + datetime.timedelta(days=i)] for i in range(12)} == {89.6883}
+    assert filled[_date('2024-01-10')] == 89.2546
+    assert filled[_date('2024-01-11')] == 88.5791
+
+
+def test_fill_days_without_earlier_rate(read_fixture):
+    rates = RUBSeeker().extract_range_rates(read_fixture('cbr_xml_dynamic.xml'))
+
+    filled = RUBSeeker.fill_days(rates, _date('2023-12-23'), _date('2023-12-26'))
+
+    assert filled == {_date('2023-12-25'): 91.7069, _date('2023-12-26'): 91.2219}
+
+
+def test_fill_days_empty_and_single_day_range(read_fixture):
+    rates = RUBSeeker().extract_range_rates(read_fixture('cbr_xml_dynamic.xml'))
+
+    assert RUBSeeker.fill_days({}, _date('2024-01-01'), _date('2024-01-05')) == {}
+    assert RUBSeeker.fill_days(rates, _date('2024-01-05'), _date('2024-01-04')) == {}
+    assert RUBSeeker.fill_days(rates, _date('2024-01-05'), _date('2024-01-05')) == {_date('2024-01-05'): 89.6883}
+
+
+def test_empty_range_response():
+    assert RUBSeeker().extract_range_rates('<ValCurs ID="R01235"></ValCurs>') == {}
+    assert ARSSeeker().extract_range_rates([]) == {}
+
+
+def test_get_range_rates_widens_lookback_over_holidays(read_fixture):
+    requests = []
+    transport = _cbr_transport(read_fixture('cbr_xml_dynamic.xml'), requests)
+
+    rates = asyncio.run(_get_range_rates(transport, 'RUB', _date('2024-01-09'), _date('2024-01-10')))
+
+    assert rates == {_date('2024-01-09'): 89.6883, _date('2024-01-10'): 89.2546}
+    assert requests == [(_date('2023-12-30'), _date('2024-01-10')), (_date('2023-12-20'), _date('2024-01-10'))]
+
+
+def test_get_range_rates_stops_widening_without_history(read_fixture):
+    requests = []
+    transport = _cbr_transport(read_fixture('cbr_xml_dynamic.xml'), requests)
+
+    rates = asyncio.run(_get_range_rates(transport, 'RUB', _date('2023-11-01'), _date('2023-11-02')))
+
+    assert rates == {}
+    assert requests[-1][0] == _date('2023-11-01') - datetime.timedelta(days=64)
+
+
+def test_fetch_rates_requests_uncovered_days_by_day(read_fixture):
+    requested_days = []
+
+    class DaySeeker(RateSeeker):
+        async def get_range_rates(self, valute_code, date0, date1):
+            return {date0: 1.5}
+
+        async def get_rate(self, valute_code, date):
+            requested_days.append(date)
+            return 2.5
+
+    valute = type('Valute', (), {'code': 'RUB'})()
+    dates = [_date('2024-01-09'), _date('2024-01-10'), _date('2024-01-11')]
+
+    rates = asyncio.run(_fetch_rates(DaySeeker(), valute, dates))
+
+    assert rates == {dates[0]: 1.5, dates[1]: 2.5, dates[2]: 2.5}
+    assert requested_days == dates[1:]
@@ -0,0 +1,79 @@
+import asyncio
+import contextvars
+
+import pytest
+
+from app.core.single_flight import SingleFlight
+
+
+caller_var: contextvars.ContextVar = contextvars.ContextVar('caller_var', default=None)
+
+
+def test_concurrent_calls_share_one_call():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 42
+
+    async def main():
+        flights = SingleFlight()
+        results = await asyncio.gather(*(flights.do('key', compute) for _ in range(5)))
+        return results, flights
+
+    results, flights = asyncio.run(main())
+
+    assert results == [42] * 5
+    assert len(calls) == 1
+    assert flights.shared_count == 4
+    assert len(flights) == 0
+
+
+def test_error_reaches_every_caller():
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise ValueError('no rates')
+
+    async def main():
+        flights = SingleFlight(ttl=10)
+        results = await asyncio.gather(*(flights.do('key', compute) for _ in range(3)), return_exceptions=True)
+        return results, flights
+
+    results, flights = asyncio.run(main())
+
+    assert [type(result) for result in results] == [ValueError] * 3
+    assert len(flights) == 0
+
+
+def test_finished_result_is_shared_for_ttl():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return len(calls)
+
+    async def main():
+        flights = SingleFlight(ttl=0.05)
+        first = await flights.do('key', compute)
+        second = await flights.do('key', compute)
+        await asyncio.sleep(0.1)
+        third = await flights.do('key', compute)
+        return [first, second, third], flights
+
+    results, flights = asyncio.run(main())
+
+    assert results == [1, 1, 2]
+    assert flights.shared_count == 1
+
+
+@pytest.mark.parametrize('ttl', [0, 10])
+def test_call_does_not_see_caller_context(ttl):
+    async def compute():
+        return caller_var.get()
+
+    async def main():
+        caller_var.set('first caller session')
+        return await SingleFlight(ttl=ttl).do('key', compute)
+
+    assert asyncio.run(main()) is None
@@ -0,0 +1,106 @@
+import asyncio
+import hashlib
+
+import httpx
+import pytest
+
+from app.tg_service import api as tg_api
+from app.tg_service.client import SendTaskSchema, TelegramClient
+from app.tg_service.schemas import (
+    DeleteMessageRequestSchema,
+    DeleteMessagesRequestSchema,
+    PhotoFileSchema,
+    SendPhotoRequestSchema,
+)
+
+
+PHOTO = b'png bytes'
+PHOTO_KEY = hashlib.sha256(PHOTO).hexdigest()
+SENT_PHOTO = {'ok': True, 'result': {
+    'message_id': 7, 'from': {'id': 1, 'is_bot': True}, 'chat': {'id': 5, 'type': 'private'}, 'date': 0,
+    'photo': [{'file_id': 'new-id', 'file_unique_id': 'u', 'width': 90, 'height': 90}]}}
+
+
+def _send_cached_photo(responses: list) -> tuple[list[bool], TelegramClient]:
+    """Send photo with cached file_id answering with responses, get which requests uploaded the file."""
+    uploads = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        uploads.append(b'filename' in request.content)
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    async def main():
+        tg_client = TelegramClient('http://tg/bott/')
+        tg_client.photo_file_ids.set(PHOTO_KEY, 'cached-id')
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as tg_client.http:
+            data = SendPhotoRequestSchema(chat_id=5, files=PhotoFileSchema(photo=PHOTO))
+            await tg_client._send(SendTaskSchema(method=tg_api.SendPhoto, data=data))
+        return tg_client
+
+    tg_client = asyncio.run(main())
+    return uploads, tg_client
+
+
+def test_wrong_file_id_is_evicted_and_photo_uploaded():
+    uploads, tg_client = _send_cached_photo([
+        httpx.Response(400, json={'ok': False, 'error_code': 400,
+                                  'description': 'Bad Request: wrong file identifier/HTTP URL specified'}),
+        httpx.Response(200, json=SENT_PHOTO),
+    ])
+
+    assert uploads == [False, True]
+    assert tg_client.photo_file_ids.get(PHOTO_KEY) == 'new-id'
+
+
+@pytest.mark.parametrize('response', [
+    httpx.ConnectError('connection refused'),
+    httpx.Response(502, text='Bad Gateway'),
+    httpx.Response(500, json={'ok': False, 'error_code': 500, 'description': 'Internal Server Error'}),
+    httpx.Response(400, json={'ok': False, 'error_code': 400, 'description': 'Bad Request: chat not found'}),
+])
+def test_file_id_is_kept_on_other_errors(response):
+    uploads, tg_client = _send_cached_photo([response])
+
+    assert uploads == [False]
+    assert tg_client.photo_file_ids.get(PHOTO_KEY) == 'cached-id'
+
+
+def _send_after_edits(method, data, response: httpx.Response) -> TelegramClient:
+    """Send request to client having sent edits to messages 1-3 of chat 5."""
+    async def main():
+        tg_client = TelegramClient('http://tg/bott/')
+        for message_id in (1, 2, 3):
+            tg_client.sent_edits.set((5, message_id), ({'text': 'x'}, None))
+        async with httpx.AsyncClient(transport=httpx.MockTransport(lambda request: response)) as tg_client.http:
+            await tg_client._send(SendTaskSchema(method=method, data=data))
+        return tg_client
+
+    return asyncio.run(main())
+
+
+def test_deleted_messages_edits_are_forgotten():
+    tg_client = _send_after_edits(
+        tg_api.DeleteMessages, DeleteMessagesRequestSchema(chat_id=5, message_ids=[1, 3]),
+        httpx.Response(200, json={'ok': True, 'result': True}))
+
+    assert [tg_client.sent_edits.get((5, i)) for i in (1, 2, 3)] == [None, ({'text': 'x'}, None), None]
+
+
+def test_deleted_message_edit_is_forgotten():
+    tg_client = _send_after_edits(
+        tg_api.DeleteMessage, DeleteMessageRequestSchema(chat_id=5, message_id=2),
+        httpx.Response(200, json={'ok': True, 'result': True}))
+
+    assert tg_client.sent_edits.get((5, 2)) is None
+    assert len(tg_client.sent_edits) == 2
+
+
+def test_failed_deletion_keeps_edits():
+    tg_client = _send_after_edits(
+        tg_api.DeleteMessages, DeleteMessagesRequestSchema(chat_id=5, message_ids=[1, 3]),
+        httpx.Response(400, json={'ok': False, 'error_code': 400, 'description': 'Bad Request: message not found'}))
+
+    assert len(tg_client.sent_edits) == 3
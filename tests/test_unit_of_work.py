@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from app.db_service.cache import context_cache
+from app.db_service.models import TGChat, TGUser, TGUserState
+from app.db_service.repository import TGChatRepository, TGUserRepository, UserStateRepository, _BaseRepo
+from app.db_service.session import commit_unit_of_work, unit_of_work
+
+
+class _Loader:
+    """Count loads of context, returning new instance every time."""
+
+    def __init__(self, make):
+        self.make = make
+        self.calls = 0
+
+    async def __call__(self, *args):
+        self.calls += 1
+        return self.make()
+
+
+def _chat() -> TGChat:
+    chat = TGChat(tg_id=-1, type='group', title='budget')
+    chat.id = 1
+    return chat
+
+
+@pytest.fixture
+def loaders(monkeypatch):
+    loaders = {
+        'chat': _Loader(_chat),
+        'user': _Loader(lambda: TGUser(id=2, tg_id=2, username='ann')),
+        'state': _Loader(lambda: TGUserState(id=3, tg_user_id=2, name='default', data_raw={})),
+    }
+    monkeypatch.setattr(TGChatRepository, '_load_by_tg_id', loaders['chat'])
+    monkeypatch.setattr(_BaseRepo, '_get_by_tg_id', loaders['user'])
+    monkeypatch.setattr(UserStateRepository, '_load_tg_user_state', loaders['state'])
+    yield loaders
+    context_cache.chats.clear()
+    context_cache.users.clear()
+    context_cache.states.clear()
+    context_cache._chat_tg_ids.clear()
+
+
+async def _get_context() -> tuple:
+    return (
+        await TGChatRepository().get_by_tg_id(-1),
+        await TGUserRepository().get_by_tg_id(2),
+        await UserStateRepository().get_tg_user_state(2),
+    )
+
+
+def test_context_cached_in_rolled_back_unit_is_reloaded(loaders):
+    async def process():
+        with pytest.raises(RuntimeError):
+            async with unit_of_work():
+                in_unit = await _get_context()
+                raise RuntimeError
+        return in_unit, await _get_context()
+
+    in_unit, after = asyncio.run(process())
+
+    assert all(first is not second for first, second in zip(in_unit, after))
+    assert [loader.calls for loader in loaders.values()] == [2, 2, 2]
+
+
+def test_context_cached_before_unit_commit_is_reloaded_after_rollback(loaders):
+    async def process():
+        with pytest.raises(RuntimeError):
+            async with unit_of_work():
+                await _get_context()
+                await commit_unit_of_work()
+                raise RuntimeError
+        return await _get_context()
+
+    asyncio.run(process())
+
+    assert [loader.calls for loader in loaders.values()] == [2, 2, 2]
+
+
+def test_context_cached_in_committed_unit_is_kept(loaders):
+    async def process():
+        async with unit_of_work():
+            in_unit = await _get_context()
+        return in_unit, await _get_context()
+
+    in_unit, after = asyncio.run(process())
+
+    assert all(first is second for first, second in zip(in_unit, after))
+    assert [loader.calls for loader in loaders.values()] == [1, 1, 1]
@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+import httpx
+
+from app.tg_service.webhook import WebhookServer
+
+
+SECRET = 'test-secret'
+USER = {'id': 111, 'is_bot': False, 'first_name': 'Ann'}
+CHAT = {'id': -1001, 'type': 'group', 'title': 'budget'}
+
+
+class FakeClient:
+    """Telegram client collecting updates put to its queues."""
+
+    def __init__(self) -> None:
+        self.updates = []
+
+    async def put_update(self, update) -> None:
+        if update:
+            self.updates.append(update)
+
+
+def _message_update(update_id: int, text: str = '/report') -> dict:
+    return {'update_id': update_id, 'message': {
+        'message_id': update_id, 'from': USER, 'chat': CHAT, 'date': 1700000000, 'text': text,
+        'entities': [{'offset': 0, 'length': len(text), 'type': 'bot_command'}]}}
+
+
+async def _send(updates: list, headers: dict = None, path: str = '/webhook') -> tuple[list[int], FakeClient]:
+    """Drive webhook server like Telegram does: POST every update over one keep-alive connection."""
+    tg_client = FakeClient()
+    server = WebhookServer(tg_client, host='127.0.0.1', port=0, path='/webhook', secret_token=SECRET)
+    await server.start()
+    headers = {'X-Telegram-Bot-Api-Secret-Token': SECRET} if headers is None else headers
+    try:
+        async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{server.port}') as sender:
+            statuses = []
+            for update in updates:
+                body = update if isinstance(update, bytes) else json.dumps(update).encode()
+                response = await sender.post(path, content=body, headers=headers)
+                statuses.append(response.status_code)
+    finally:
+        await server.stop()
+    return statuses, tg_client
+
+
+def test_updates_are_put_to_client():
+    statuses, tg_client = asyncio.run(_send([_message_update(1), _message_update(2, '/add')]))
+
+    assert statuses == [200, 200]
+    assert [update.command for update in tg_client.updates] == ['/report', '/add']
+
+
+def test_duplicate_updates_are_skipped():
+    statuses, tg_client = asyncio.run(_send([_message_update(1), _message_update(1), _message_update(2)]))
+
+    assert statuses == [200, 200, 200]
+    assert [update.message_id for update in tg_client.updates] == [1, 2]
+
+
+def test_wrong_secret_is_rejected():
+    statuses, tg_client = asyncio.run(_send(
+        [_message_update(1), _message_update(2)], headers={'X-Telegram-Bot-Api-Secret-Token': 'other'}))
+    missing_statuses, _ = asyncio.run(_send([_message_update(3)], headers={}))
+
+    assert statuses == [403, 403]
+    assert missing_statuses == [403]
+    assert tg_client.updates == []
+
+
+def test_unknown_path_is_not_found():
+    statuses, tg_client = asyncio.run(_send([_message_update(1)], path='/other'))
+
+    assert statuses == [404]
+    assert tg_client.updates == []
+
+
+def test_invalid_and_unhandled_updates_are_acknowledged():
+    edited = {'update_id': 2, 'edited_message': _message_update(2)['message']}
+    statuses, tg_client = asyncio.run(_send([b'not json', {'update_id': 1, 'message': {}}, edited]))
+
+    assert statuses == [200, 200, 200]
+    assert tg_client.updates == []